@@ -3,16 +3,28 @@ load_dotenv()
 
 import streamlit as st
 import os
-import google.generativeai as genai
-from PIL import Image
-import json
 from datetime import datetime, timedelta
-import sqlite3
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from io import BytesIO
-import hashlib
+import functools
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+# plotly.express and google.generativeai are slow to import; they load on first use
+# (the chart blocks below and gemini_client) so the login page never pays for them
+from database import (init_database, authenticate_user, create_user, save_meal_log,
+                      save_water_log, save_workout, save_progress, get_meal_logs, get_daily_totals,
+                      get_water_intake, get_progress_history, get_workout_history, get_range_totals,
+                      query_cache, water_buffer)
+from data_export import EXPORT_TABLES, PARQUET_AVAILABLE, stream_export
+from gemini_client import configure as configure_gemini, get_gateway, stream_gemini_response
+from jobs import get_job_queue, list_jobs, find_image_analysis
+from image_pipeline import preprocess_image
+from batch_analysis import analyze_photos, log_batch_results
+from catalog import RecipeCatalog, load_recipe_catalog, load_workouts_from_csv
+from health_metrics import (calculate_bmi, get_bmi_category, calculate_tdee, get_macro_breakdown,
+                            calculate_body_fat_estimate, get_calorie_deficit)
+from meal_planner import plan_meals, describe_plan_prompt
+from diet_recommender import load_diet_recommender
+from cohort_analytics import COHORT_DIMENSIONS, open_cohort_store
+from instrumentation import PERF_ENABLED, get_recorder, run as perf_run, span
 
 # Configure Gemini
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -20,279 +32,56 @@ if not GOOGLE_API_KEY:
     st.error("❌ API Key not found!")
     st.stop()
 
-try:
-    genai.configure(api_key=GOOGLE_API_KEY)
-except Exception as e:
-    st.error(f"❌ Failed to configure API: {str(e)}")
-    st.stop()
-
-# Database initialization
-def init_database():
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password_hash TEXT, created_at TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS health_profiles
-                 (id INTEGER PRIMARY KEY, user_id INTEGER, profile_data TEXT, created_at TEXT, updated_at TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS meal_logs
-                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, meal_type TEXT, food_name TEXT, 
-                  calories INTEGER, protein REAL, carbs REAL, fats REAL, created_at TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS water_logs
-                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, cups REAL, created_at TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS workout_logs
-                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, exercise TEXT, duration INTEGER, 
-                  calories_burned INTEGER, intensity TEXT, created_at TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS progress_tracking
-                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, weight REAL, waist REAL, 
-                  hip REAL, chest REAL, notes TEXT, created_at TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS favorites
-                 (id INTEGER PRIMARY KEY, user_id INTEGER, item_type TEXT, item_data TEXT, created_at TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS goals
-                 (id INTEGER PRIMARY KEY, user_id INTEGER, goal_text TEXT, target_value REAL, 
-                  target_date TEXT, achieved INTEGER, created_at TEXT)''')
-    
-    conn.commit()
-    conn.close()
-
-init_database()
-
 # Utility Functions
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def authenticate_user(username, password):
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('SELECT id FROM users WHERE username=? AND password_hash=?', 
-              (username, hash_password(password)))
-    result = c.fetchone()
-    conn.close()
-    return result[0] if result else None
-
-def create_user(username, password):
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    try:
-        c.execute('INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
-                 (username, hash_password(password), datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
-        return True
-    except:
-        conn.close()
-        return False
-
-def calculate_bmi(weight_kg, height_m):
-    return round(weight_kg / (height_m ** 2), 1)
-
-def get_bmi_category(bmi):
-    if bmi < 18.5:
-        return "Underweight", "🟡"
-    elif 18.5 <= bmi < 25:
-        return "Normal", "🟢"
-    elif 25 <= bmi < 30:
-        return "Overweight", "🟠"
-    else:
-        return "Obese", "🔴"
-
-def calculate_tdee(weight_kg, height_cm, age, gender, activity_level):
-    if gender.lower() == 'male':
-        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + 5
-    else:
-        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
-    
-    activity_multipliers = {
-        'sedentary': 1.2,
-        'light': 1.375,
-        'moderate': 1.55,
-        'active': 1.725,
-        'very_active': 1.9
-    }
-    tdee = bmr * activity_multipliers.get(activity_level, 1.55)
-    return round(tdee), round(bmr)
-
-def get_macro_breakdown(calories, protein_percent=30, carb_percent=50, fat_percent=20):
-    return {
-        'protein_g': round((calories * protein_percent / 100) / 4, 1),
-        'carbs_g': round((calories * carb_percent / 100) / 4, 1),
-        'fat_g': round((calories * fat_percent / 100) / 9, 1)
-    }
-
-def calculate_whr(waist_cm, hip_cm):
-    return round(waist_cm / hip_cm, 2)
-
-def calculate_body_fat_estimate(bmi, age, gender):
-    if gender.lower() == 'male':
-        body_fat = (1.20 * bmi) + (0.23 * age) - 16.2
-    else:
-        body_fat = (1.20 * bmi) + (0.23 * age) - 5.4
-    return round(max(0, body_fat), 1)
-
-def get_calorie_deficit(tdee, weight_loss_goal_weeks):
-    weekly_deficit = 7000 / weight_loss_goal_weeks
-    daily_deficit = weekly_deficit / 7
-    return round(tdee - daily_deficit)
-
-def save_meal_log(user_id, meal_data):
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO meal_logs (user_id, date, meal_type, food_name, calories, protein, carbs, fats, created_at)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-             (user_id, meal_data['date'], meal_data['meal_type'], meal_data['food_name'],
-              meal_data['calories'], meal_data.get('protein', 0), meal_data.get('carbs', 0), 
-              meal_data.get('fats', 0), datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
-
-def save_water_log(user_id, cups, date=None):
-    if date is None:
-        date = datetime.now().strftime('%Y-%m-%d')
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('INSERT INTO water_logs (user_id, date, cups, created_at) VALUES (?, ?, ?, ?)',
-             (user_id, date, cups, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
-
-def save_workout(user_id, workout_data):
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO workout_logs (user_id, date, exercise, duration, calories_burned, intensity, created_at)
-                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
-             (user_id, workout_data['date'], workout_data['exercise'], workout_data['duration'],
-              workout_data['calories_burned'], workout_data['intensity'], datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
-
-def save_progress(user_id, progress_data):
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('''INSERT INTO progress_tracking (user_id, date, weight, waist, hip, chest, notes, created_at)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
-             (user_id, progress_data['date'], progress_data.get('weight'), progress_data.get('waist'),
-              progress_data.get('hip'), progress_data.get('chest'), progress_data.get('notes', ''),
-              datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
-
-def get_meal_logs(user_id, date=None):
-    if date is None:
-        date = datetime.now().strftime('%Y-%m-%d')
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('SELECT * FROM meal_logs WHERE user_id=? AND date=? ORDER BY created_at DESC', (user_id, date))
-    meals = c.fetchall()
-    conn.close()
-    return meals
-
-def get_daily_totals(user_id, date=None):
-    if date is None:
-        date = datetime.now().strftime('%Y-%m-%d')
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('''SELECT SUM(calories) as calories, SUM(protein) as protein, SUM(carbs) as carbs, SUM(fats) as fats
-                 FROM meal_logs WHERE user_id=? AND date=?''', (user_id, date))
-    result = c.fetchone()
-    conn.close()
-    return {
-        'calories': int(result[0]) if result[0] else 0,
-        'protein': float(result[1]) if result[1] else 0,
-        'carbs': float(result[2]) if result[2] else 0,
-        'fats': float(result[3]) if result[3] else 0
-    }
-
-def get_water_intake(user_id, date=None):
-    if date is None:
-        date = datetime.now().strftime('%Y-%m-%d')
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    c.execute('SELECT SUM(cups) FROM water_logs WHERE user_id=? AND date=?', (user_id, date))
-    result = c.fetchone()
-    conn.close()
-    return result[0] or 0
-
-def get_progress_history(user_id, days=30):
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-    c.execute('SELECT date, weight FROM progress_tracking WHERE user_id=? AND date>=? ORDER BY date',
-             (user_id, start_date))
-    data = c.fetchall()
-    conn.close()
-    return data
-
-def get_workout_history(user_id, days=30):
-    conn = sqlite3.connect('nutrition_app.db')
-    c = conn.cursor()
-    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
-    c.execute('SELECT date, exercise, duration, calories_burned FROM workout_logs WHERE user_id=? AND date>=? ORDER BY date',
-             (user_id, start_date))
-    data = c.fetchall()
-    conn.close()
-    return data
-
-def export_to_csv(user_id):
-    conn = sqlite3.connect('nutrition_app.db')
-    df = pd.read_sql_query('SELECT * FROM meal_logs WHERE user_id=? ORDER BY date DESC LIMIT 100', conn, params=(user_id,))
-    conn.close()
-    return df.to_csv(index=False).encode()
-
-def get_gemini_response(input_prompt, image_data=None):
-    try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        content = [input_prompt]
-        if image_data:
-            content.extend(image_data)
-        response = model.generate_content(content)
-        return response.text
-    except Exception as e:
-        return f"❌ Error: {str(e)}"
+def render_stream(chunks):
+    """Render streamed text progressively and return the full text"""
+    placeholder = st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return text
+
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else 'local'
+
+def tab_fragment(func):
+    """st.fragment whose fragment-only reruns are profiled as runs of their own"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with perf_run(session_id(), f"fragment:{func.__name__}"):
+            return func(*args, **kwargs)
+    return st.fragment(wrapper)
+
+def show_perf_panel():
+    """Hidden profiling panel; needs NUTRITION_PERF=1 and ?perf=1 in the URL"""
+    recorder = get_recorder()
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        runs = recorder.session_runs(session_id())
+        if runs:
+            st.write("**This session (latest runs)**")
+            st.dataframe(pd.DataFrame([{
+                'Run': r['run'], 'Label': r['label'], 'ms': r['ms'],
+                **{f"{kind} ms": total['ms'] for kind, total in r['totals'].items()},
+                **{f"{kind} #": total['count'] for kind, total in r['totals'].items()}
+            } for r in runs]), hide_index=True)
+            st.write("**Slowest events in the last run**")
+            events = sorted(runs[0]['events'], key=lambda e: e['ms'], reverse=True)[:15]
+            st.dataframe(pd.DataFrame([{'kind': e['kind'], 'name': e['name'], 'ms': e['ms'],
+                                        'rows': e.get('rows'), 'bytes': e.get('bytes', e.get('bytes_out'))}
+                                       for e in events]), hide_index=True)
+        st.write("**All sessions (p50/p95/p99 ms)**")
+        st.dataframe(pd.DataFrame(recorder.summary()), hide_index=True)
+        st.caption(f"Query cache: {query_cache.stats()} · Gemini: {get_gateway().metrics()}")
 
 def input_image_setup(uploaded_file):
     if uploaded_file is not None:
-        bytes_data = uploaded_file.getvalue()
-        image_parts = [{"mime_type": uploaded_file.type, "data": bytes_data}]
-        return image_parts
-    return None
-
-# Load CSV Data
-def load_meals_from_csv():
-    """Load meals from CSV file"""
-    try:
-        df = pd.read_csv('meals.csv')
-        meals = []
-        for _, row in df.iterrows():
-            meal = {
-                'name': row['name'],
-                'calories': int(row['calories']),
-                'prep_time': row['prep_time'],
-                'protein': float(row['protein']),
-                'carbs': float(row['carbs']),
-                'fats': float(row['fats']),
-                'ingredients': row['ingredients'].split(',')
-            }
-            meals.append(meal)
-        return meals
-    except FileNotFoundError:
-        return None
-
-def load_workouts_from_csv():
-    """Load workouts from CSV file"""
-    try:
-        df = pd.read_csv('workouts.csv')
-        workouts = []
-        for _, row in df.iterrows():
-            workout = {
-                'name': row['name'],
-                'duration': int(row['duration_mins']),
-                'calories': int(row['calories_burned']),
-                'intensity': row['intensity'].lower()
-            }
-            workouts.append(workout)
-        return workouts
-    except FileNotFoundError:
-        return None
+        prepared = preprocess_image(uploaded_file.getvalue())
+        image_parts = [{"mime_type": prepared['mime_type'], "data": prepared['data']}]
+        return image_parts, prepared
+    return None, None
 
 # Sample Data (fallback if CSV files not found)
 SAMPLE_RECIPES = [
@@ -331,6 +120,15 @@ NUTRITION_ARTICLES = [
     {'title': 'Superfoods You Should Know About', 'preview': 'Nutrient-dense foods to add to your diet for better health...'},
 ]
 
+FOOD_ANALYSIS_PROMPT = """Analyze the food in this image. Provide:
+1. Identified foods and estimated portion sizes
+2. Estimated calories
+3. Macronutrient breakdown (protein, carbs, fats in grams)
+4. Dietary restriction notes
+5. Healthier alternatives or portion suggestions"""
+
+JOB_STATUS_ICONS = {'queued': '⏳', 'running': '⚙️', 'done': '✅', 'failed': '❌'}
+
 # PAGE CONFIG
 st.set_page_config(page_title="AI Health Companion", layout="wide", initial_sidebar_state="expanded")
 
@@ -340,15 +138,38 @@ if 'user_id' not in st.session_state:
 if 'current_date' not in st.session_state:
     st.session_state.current_date = datetime.now().strftime('%Y-%m-%d')
 
-# Load CSV data at startup
-csv_recipes = load_meals_from_csv()
-csv_workouts = load_workouts_from_csv()
+# Process Bootstrap
+@st.cache_resource(show_spinner="Starting up...")
+def bootstrap():
+    """Schema, Gemini client and CSV catalogs, set up once per process instead of on every rerun"""
+    configure_gemini(GOOGLE_API_KEY)
+    init_database()
+    # Starting the queue resumes jobs a previous process left queued or running
+    get_job_queue()
+    return {
+        'recipe_catalog': load_recipe_catalog(),
+        'workouts': load_workouts_from_csv(),
+        'diet_recommender': load_diet_recommender(),
+        'cohort_store': open_cohort_store()
+    }
+
+try:
+    startup = bootstrap()
+except Exception as e:
+    st.error(f"❌ Failed to start: {str(e)}")
+    st.stop()
+
+recipe_catalog = startup['recipe_catalog']
+diet_recommender = startup['diet_recommender']
+cohort_store = startup['cohort_store']
 
 # Use CSV data if available, otherwise use sample data
-if csv_recipes:
-    SAMPLE_RECIPES = csv_recipes
-if csv_workouts:
-    WORKOUT_TEMPLATES = csv_workouts
+if recipe_catalog:
+    SAMPLE_RECIPES = recipe_catalog.recipes
+else:
+    recipe_catalog = RecipeCatalog(SAMPLE_RECIPES)
+if startup['workouts']:
+    WORKOUT_TEMPLATES = startup['workouts']
 
 
 # LOGIN/SIGNUP PAGE
@@ -394,6 +215,8 @@ def show_main_app():
     col1, col2, col3 = st.columns([3, 1, 1])
     with col3:
         if st.button("🚪 Logout"):
+            # Don't leave this session's water clicks waiting in the write buffer
+            water_buffer.flush(user_id)
             st.session_state.user_id = None
             st.rerun()
     
@@ -447,343 +270,589 @@ def show_main_app():
         st.metric("Water", f"{water_intake:.1f} / 8 cups")
     
     # TABS
+    # Only the open tab's body runs (on_change="rerun" makes tabs lazy), and each body
+    # is a fragment, so its widgets rerun that tab alone. Writes that change the sidebar
+    # totals call st.rerun() for a full run: sidebar plus the open tab.
     tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs([
         "🍽️ Meals", "💧 Water", "🏋️ Workouts", "⚖️ Progress", 
         "🏥 Health Metrics", "🎓 Education", "🛒 Shopping", "⭐ Favorites", "📊 Dashboard"
-    ])
+    ], key="main_tab", on_change="rerun")
     
-    # TAB 1: MEAL PLANNING & LOGGING
     with tab1:
-        st.subheader("🍽️ Meal Management")
-        col_m1, col_m2 = st.columns([2, 1])
-        
-        with col_m2:
-            st.session_state.current_date = st.date_input("Select Date", 
-                                                           datetime.now()).strftime('%Y-%m-%d')
-        
-        col_ma, col_mb = st.columns(2)
+        if tab1.open:
+            render_meals_tab(user_id, tdee)
+
+    with tab2:
+        if tab2.open:
+            render_water_tab(user_id)
+
+    with tab3:
+        if tab3.open:
+            render_workouts_tab(user_id)
+
+    with tab4:
+        if tab4.open:
+            render_progress_tab(user_id)
+
+    with tab5:
+        if tab5.open:
+            render_health_metrics_tab(weight, height_m, age, gender, activity, bmi)
+
+    with tab6:
+        if tab6.open:
+            render_education_tab()
+
+    with tab7:
+        if tab7.open:
+            render_shopping_tab()
+
+    with tab8:
+        if tab8.open:
+            render_favorites_tab()
+
+    with tab9:
+        if tab9.open:
+            render_dashboard_tab(user_id)
+
+
+# TAB 1: MEAL PLANNING & LOGGING
+@tab_fragment
+def render_meals_tab(user_id, tdee):
+    st.subheader("🍽️ Meal Management")
+    col_m1, col_m2 = st.columns([2, 1])
+    
+    with col_m2:
+        # Seeded from session state so the pick survives while other tabs are open
+        selected_date = st.date_input("Select Date", 
+                                      datetime.strptime(st.session_state.current_date, '%Y-%m-%d')).strftime('%Y-%m-%d')
+        if selected_date != st.session_state.current_date:
+            # The sidebar shows totals for this date, so it needs a full rerun
+            st.session_state.current_date = selected_date
+            st.rerun()
+    
+    col_ma, col_mb = st.columns(2)
+    
+    with col_ma:
+        st.write("### Quick Add Recipe")
+        selected_recipe = st.selectbox("Choose Recipe", recipe_catalog.names())
+        if st.button("➕ Add Recipe to Meal Log"):
+            recipe = recipe_catalog.get(selected_recipe)
+            meal_data = {
+                'date': st.session_state.current_date,
+                'meal_type': 'recipe',
+                'food_name': recipe['name'],
+                'calories': recipe['calories'],
+                'protein': recipe['protein'],
+                'carbs': recipe['carbs'],
+                'fats': recipe['fats']
+            }
+            save_meal_log(user_id, meal_data)
+            st.success(f"✅ Added {recipe['name']}")
+            st.rerun()
         
-        with col_ma:
-            st.write("### Quick Add Recipe")
-            selected_recipe = st.selectbox("Choose Recipe", [r['name'] for r in SAMPLE_RECIPES])
-            if st.button("➕ Add Recipe to Meal Log"):
-                recipe = next(r for r in SAMPLE_RECIPES if r['name'] == selected_recipe)
+        with st.expander("🔎 Find Recipes"):
+            find_max_cal = st.number_input("Max calories", 0, 3000, 600, key="find_max_cal")
+            find_min_protein = st.number_input("Min protein (g)", 0, 200, 0, key="find_min_protein")
+            find_exclude = st.text_input("Exclude ingredients (comma separated)", key="find_exclude")
+            matches = recipe_catalog.query(max_calories=find_max_cal, min_protein=find_min_protein,
+                                           exclude=[i for i in find_exclude.split(',') if i.strip()], limit=20)
+            for r in matches:
+                st.write(f"**{r['name']}** - {r['calories']} cal, {r['protein']:.0f}g protein")
+            if not matches:
+                st.info("No recipes match these filters")
+    
+    with col_mb:
+        st.write("### Manual Entry")
+        food_name = st.text_input("Food Name")
+        cal_input = st.number_input("Calories", 0, 2000, 500)
+        protein_input = st.number_input("Protein (g)", 0.0, 200.0, 25.0)
+        carbs_input = st.number_input("Carbs (g)", 0.0, 300.0, 50.0)
+        fats_input = st.number_input("Fats (g)", 0.0, 100.0, 20.0)
+        
+        if st.button("➕ Add Meal"):
+            if food_name:
                 meal_data = {
                     'date': st.session_state.current_date,
-                    'meal_type': 'recipe',
-                    'food_name': recipe['name'],
-                    'calories': recipe['calories'],
-                    'protein': recipe['protein'],
-                    'carbs': recipe['carbs'],
-                    'fats': recipe['fats']
+                    'meal_type': 'manual',
+                    'food_name': food_name,
+                    'calories': cal_input,
+                    'protein': protein_input,
+                    'carbs': carbs_input,
+                    'fats': fats_input
                 }
                 save_meal_log(user_id, meal_data)
-                st.success(f"✅ Added {recipe['name']}")
+                st.success("✅ Meal added!")
                 st.rerun()
-        
-        with col_mb:
-            st.write("### Manual Entry")
-            food_name = st.text_input("Food Name")
-            cal_input = st.number_input("Calories", 0, 2000, 500)
-            protein_input = st.number_input("Protein (g)", 0.0, 200.0, 25.0)
-            carbs_input = st.number_input("Carbs (g)", 0.0, 300.0, 50.0)
-            fats_input = st.number_input("Fats (g)", 0.0, 100.0, 20.0)
-            
-            if st.button("➕ Add Meal"):
-                if food_name:
-                    meal_data = {
-                        'date': st.session_state.current_date,
-                        'meal_type': 'manual',
-                        'food_name': food_name,
-                        'calories': cal_input,
-                        'protein': protein_input,
-                        'carbs': carbs_input,
-                        'fats': fats_input
-                    }
-                    save_meal_log(user_id, meal_data)
-                    st.success("✅ Meal added!")
-                    st.rerun()
-        
-        st.markdown("---")
-        st.write("### Today's Meals")
-        meals = get_meal_logs(user_id, st.session_state.current_date)
-        if meals:
-            meal_df = pd.DataFrame(meals, columns=['ID', 'User', 'Date', 'Type', 'Food', 'Cal', 'P', 'C', 'F', 'Created'])
-            st.dataframe(meal_df[['Food', 'Cal', 'P', 'C', 'F']], use_container_width=True)
+    
+    st.markdown("---")
+    st.write("### Today's Meals")
+    meals = get_meal_logs(user_id, st.session_state.current_date)
+    if meals:
+        meal_df = pd.DataFrame(meals, columns=['ID', 'User', 'Date', 'Type', 'Food', 'Cal', 'P', 'C', 'F', 'Created'])
+        st.dataframe(meal_df[['Food', 'Cal', 'P', 'C', 'F']], width="stretch")
+    else:
+        st.info("No meals logged yet")
+    
+    # Local meal planning
+    st.markdown("---")
+    st.write("### ⚡ Quick 7-Day Meal Plan")
+    col_p1, col_p2 = st.columns(2)
+    with col_p1:
+        plan_meals_per_day = st.selectbox("Meals per day", [2, 3, 4], index=1, key="plan_meals_per_day")
+    with col_p2:
+        plan_exclude = st.text_input("Avoid ingredients (comma separated)", key="plan_exclude")
+    if st.button("⚡ Build Plan"):
+        try:
+            st.session_state.meal_plan = plan_meals(recipe_catalog, tdee, get_macro_breakdown(tdee),
+                                                    meals_per_day=plan_meals_per_day,
+                                                    exclude=[i for i in plan_exclude.split(',') if i.strip()])
+        except ValueError as e:
+            st.warning(f"⚠️ {e}")
+    meal_plan = st.session_state.get('meal_plan')
+    if meal_plan:
+        targets = meal_plan['targets']
+        st.caption(f"Target {targets['calories']:.0f} kcal · {targets['protein']:.0f}g P · {targets['carbs']:.0f}g C · "
+                   f"{targets['fats']:.0f}g F per day — planned in {meal_plan['elapsed_ms']:.0f} ms")
+        plan_df = pd.DataFrame([{'Day': day['day'], **{meal['slot']: meal['name'] for meal in day['meals']},
+                                 'Cal': day['totals']['calories'], 'P': day['totals']['protein'],
+                                 'C': day['totals']['carbs'], 'F': day['totals']['fats']}
+                                for day in meal_plan['days']])
+        st.dataframe(plan_df, width="stretch", hide_index=True)
+        if st.button("✍️ Add AI Notes & Prep Tips"):
+            render_stream(stream_gemini_response(describe_plan_prompt(meal_plan)))
+    
+    # AI Meal Planning
+    st.markdown("---")
+    st.write("### 🤖 AI Meal Plan Generator")
+    goal = st.text_area("Describe your meal plan goals",
+                       placeholder="e.g., Vegetarian weight loss plan for 1500 calories")
+    run_in_background = st.checkbox("Run in background (keep using other tabs)", key="plan_background")
+    if st.button("🚀 Generate AI Meal Plan"):
+        if goal:
+            prompt = f"""Create a detailed meal plan for: {goal}
+            Include:
+            1. 7-day meal schedule
+            2. Calorie targets and macros
+            3. Shopping list
+            4. Prep tips
+            Format with clear sections."""
+            if run_in_background:
+                job_id = get_job_queue().submit(user_id, 'meal_plan', f"Meal plan: {goal[:50]}", {'prompt': prompt})
+                st.success(f"✅ Queued as job #{job_id}. Collect it under My AI Jobs below.")
+            else:
+                response = render_stream(stream_gemini_response(prompt))
+                st.download_button("📥 Download Plan", response, "meal_plan.txt", "text/plain")
+    
+    # Food photo analysis
+    st.markdown("---")
+    st.write("### 📷 Food Photo Analysis")
+    food_photo = st.file_uploader("Upload a meal photo", type=["jpg", "jpeg", "png"], key="food_photo")
+    if st.button("🔍 Analyze in Background") and food_photo is not None:
+        image_data, prepared = input_image_setup(food_photo)
+        st.caption(f"Optimized upload: {prepared['original_bytes'] / 1024:.0f} KB → {prepared['bytes'] / 1024:.0f} KB "
+                   f"({prepared['width']}×{prepared['height']}) in {prepared['elapsed_ms']:.0f} ms")
+        previous = find_image_analysis(user_id, prepared['phash'])
+        if previous and previous['status'] == 'done':
+            st.info(f"♻️ This looks like the photo analysed in job #{previous['id']}; reusing that result.")
+            st.markdown(previous['result'])
+        elif previous:
+            st.info(f"♻️ This photo is already being analysed in job #{previous['id']}. "
+                    "Its result will appear under My AI Jobs.")
         else:
-            st.info("No meals logged yet")
-        
-        # AI Meal Planning
-        st.markdown("---")
-        st.write("### 🤖 AI Meal Plan Generator")
-        goal = st.text_area("Describe your meal plan goals",
-                           placeholder="e.g., Vegetarian weight loss plan for 1500 calories")
-        if st.button("🚀 Generate AI Meal Plan"):
-            if goal:
-                with st.spinner("Generating personalized meal plan..."):
-                    prompt = f"""Create a detailed meal plan for: {goal}
-                    Include:
-                    1. 7-day meal schedule
-                    2. Calorie targets and macros
-                    3. Shopping list
-                    4. Prep tips
-                    Format with clear sections."""
-                    response = get_gemini_response(prompt)
-                    st.markdown(response)
-                    st.download_button("📥 Download Plan", response, "meal_plan.txt", "text/plain")
-    
-    # TAB 2: WATER TRACKING
-    with tab2:
-        st.subheader("💧 Hydration Tracker")
-        
-        col_w1, col_w2, col_w3 = st.columns(3)
-        with col_w1:
-            cups_to_add = st.number_input("Cups to add", 0.0, 10.0, 1.0, key="water_cups")
-            if st.button("➕ Add Water"):
-                save_water_log(user_id, cups_to_add, st.session_state.current_date)
-                st.success("✅ Water logged!")
-                st.rerun()
-        
-        with col_w2:
-            st.metric("Daily Goal", "8 cups")
-            current_water = get_water_intake(user_id, st.session_state.current_date)
-            st.metric("Current", f"{current_water:.1f} cups")
-        
-        with col_w3:
-            remaining = max(0, 8 - current_water)
-            st.metric("Remaining", f"{remaining:.1f} cups")
-        
-        # Progress bar
-        st.progress(min(current_water / 8, 1.0))
-        
-        # Tips
-        st.info("""
-        💧 **Hydration Tips:**
-        - Drink water with every meal
-        - Start your day with a glass of water
-        - Keep a water bottle with you
-        - Drink before, during, and after workouts
-        """)
-    
-    # TAB 3: WORKOUTS
-    with tab3:
-        st.subheader("🏋️ Workout Tracking")
-        
-        col_w1, col_w2 = st.columns(2)
-        
-        with col_w1:
-            st.write("### Quick Log Workout")
-            workout_name = st.selectbox("Select Workout", [w['name'] for w in WORKOUT_TEMPLATES])
-            selected_workout = next(w for w in WORKOUT_TEMPLATES if w['name'] == workout_name)
-            
-            duration = st.number_input("Duration (minutes)", 0, 300, selected_workout['duration'])
-            
-            if st.button("➕ Log Workout"):
-                workout_data = {
-                    'date': st.session_state.current_date,
-                    'exercise': selected_workout['name'],
-                    'duration': duration,
-                    'calories_burned': int(selected_workout['calories'] * duration / selected_workout['duration']),
-                    'intensity': selected_workout['intensity']
-                }
-                save_workout(user_id, workout_data)
-                st.success("✅ Workout logged!")
-                st.rerun()
-        
-        with col_w2:
-            st.write("### Workout Templates")
-            for w in WORKOUT_TEMPLATES:
-                st.write(f"**{w['name']}** - {w['duration']}min, {w['calories']}cal, {w['intensity']} intensity")
-        
-        # Workout history chart
-        st.markdown("---")
-        workout_hist = get_workout_history(user_id, 30)
-        if workout_hist:
-            workout_df = pd.DataFrame(workout_hist, columns=['Date', 'Exercise', 'Duration', 'Calories'])
-            st.write("### Last 30 Days Workouts")
-            st.dataframe(workout_df, use_container_width=True)
-            
-            # Chart
+            job_id = get_job_queue().submit(user_id, 'image_analysis', f"Photo: {food_photo.name}",
+                                            {'prompt': FOOD_ANALYSIS_PROMPT, 'mime_type': image_data[0]['mime_type'],
+                                             'phash': prepared['phash']},
+                                            image_data[0]['data'])
+            st.success(f"✅ Queued as job #{job_id}")
+    
+    # Batch photo logging
+    st.markdown("---")
+    st.write("### 📸 Batch Photo Logging")
+    batch_photos = st.file_uploader("Upload a day's or week's meal photos", type=["jpg", "jpeg", "png"],
+                                    accept_multiple_files=True, key="batch_photos")
+    if st.button("🍱 Analyze & Log All") and batch_photos:
+        progress = st.progress(0.0)
+        finished = []
+        
+        def on_result(result):
+            finished.append(result)
+            progress.progress(len(finished) / len(batch_photos))
+        
+        results = analyze_photos([(p.name, p.getvalue()) for p in batch_photos],
+                                 st.session_state.current_date, on_result=on_result)
+        logged = log_batch_results(user_id, results)
+        st.success(f"✅ Logged {logged} of {len(results)} meals")
+        ok_rows = [{'Photo': r['name'], 'Date': r['meal']['date'], 'Food': r['meal']['food_name'],
+                    'Cal': r['meal']['calories'], 'P': r['meal']['protein'], 'C': r['meal']['carbs'],
+                    'F': r['meal']['fats']} for r in results if r['ok']]
+        if ok_rows:
+            st.dataframe(pd.DataFrame(ok_rows), width="stretch")
+        for r in results:
+            if not r['ok']:
+                st.warning(f"⚠️ {r['name']}: {r['error']}")
+    
+    # Background jobs
+    st.markdown("---")
+    col_j1, col_j2 = st.columns([3, 1])
+    with col_j1:
+        st.write("### 📬 My AI Jobs")
+    with col_j2:
+        if st.button("🔄 Refresh", key="jobs_refresh"):
+            # Jobs finished by another process only reach this process's cache after its TTL
+            query_cache.invalidate(user_id, None, 'jobs')
+    user_jobs = list_jobs(user_id)
+    if not user_jobs:
+        st.info("No background jobs yet")
+    for job in user_jobs:
+        with st.expander(f"{JOB_STATUS_ICONS.get(job['status'], '')} #{job['id']} {job['title']} ({job['status']})"):
+            st.caption(f"Submitted {job['created_at'][:16].replace('T', ' ')}")
+            if job['status'] == 'done':
+                st.markdown(job['result'])
+                st.download_button("📥 Download", job['result'], f"{job['kind']}_{job['id']}.txt",
+                                   "text/plain", key=f"job_dl_{job['id']}")
+            elif job['status'] == 'failed':
+                st.error(f"❌ Error: {job['error']}")
+            else:
+                st.info("Still working on it. Press Refresh to check again.")
+
+
+# TAB 2: WATER TRACKING
+@tab_fragment
+def render_water_tab(user_id):
+    st.subheader("💧 Hydration Tracker")
+    
+    col_w1, col_w2, col_w3 = st.columns(3)
+    with col_w1:
+        cups_to_add = st.number_input("Cups to add", 0.0, 10.0, 1.0, key="water_cups")
+        if st.button("➕ Add Water"):
+            save_water_log(user_id, cups_to_add, st.session_state.current_date)
+            st.success("✅ Water logged!")
+            st.rerun()
+    
+    with col_w2:
+        st.metric("Daily Goal", "8 cups")
+        current_water = get_water_intake(user_id, st.session_state.current_date)
+        st.metric("Current", f"{current_water:.1f} cups")
+    
+    with col_w3:
+        remaining = max(0, 8 - current_water)
+        st.metric("Remaining", f"{remaining:.1f} cups")
+    
+    # Progress bar
+    st.progress(min(current_water / 8, 1.0))
+    
+    # Tips
+    st.info("""
+    💧 **Hydration Tips:**
+    - Drink water with every meal
+    - Start your day with a glass of water
+    - Keep a water bottle with you
+    - Drink before, during, and after workouts
+    """)
+
+
+# TAB 3: WORKOUTS
+@tab_fragment
+def render_workouts_tab(user_id):
+    st.subheader("🏋️ Workout Tracking")
+    
+    col_w1, col_w2 = st.columns(2)
+    
+    with col_w1:
+        st.write("### Quick Log Workout")
+        workout_name = st.selectbox("Select Workout", [w['name'] for w in WORKOUT_TEMPLATES])
+        selected_workout = next(w for w in WORKOUT_TEMPLATES if w['name'] == workout_name)
+        
+        duration = st.number_input("Duration (minutes)", 0, 300, selected_workout['duration'])
+        
+        if st.button("➕ Log Workout"):
+            workout_data = {
+                'date': st.session_state.current_date,
+                'exercise': selected_workout['name'],
+                'duration': duration,
+                'calories_burned': int(selected_workout['calories'] * duration / selected_workout['duration']),
+                'intensity': selected_workout['intensity']
+            }
+            save_workout(user_id, workout_data)
+            st.success("✅ Workout logged!")
+    
+    with col_w2:
+        st.write("### Workout Templates")
+        for w in WORKOUT_TEMPLATES:
+            st.write(f"**{w['name']}** - {w['duration']}min, {w['calories']}cal, {w['intensity']} intensity")
+    
+    # Workout history chart
+    st.markdown("---")
+    workout_hist = get_workout_history(user_id, 30)
+    if workout_hist:
+        workout_df = pd.DataFrame(workout_hist, columns=['Date', 'Exercise', 'Duration', 'Calories'])
+        st.write("### Last 30 Days Workouts")
+        st.dataframe(workout_df, use_container_width=True)
+        
+        # Chart
+        with span('chart', 'workouts_bar', rows=len(workout_df)):
+            import plotly.express as px
             fig = px.bar(workout_df, x='Date', y='Calories', title='Calories Burned by Workout',
                         labels={'Calories': 'Calories Burned'})
             st.plotly_chart(fig, use_container_width=True)
+
+
+# TAB 4: PROGRESS TRACKING
+@tab_fragment
+def render_progress_tab(user_id):
+    st.subheader("⚖️ Body Measurements")
     
-    # TAB 4: PROGRESS TRACKING
-    with tab4:
-        st.subheader("⚖️ Body Measurements")
-        
-        col_p1, col_p2 = st.columns(2)
-        
-        with col_p1:
-            st.write("### Log Measurements")
-            meas_weight = st.number_input("Weight (kg)", 0.0, 500.0, 70.0, key="meas_weight")
-            meas_waist = st.number_input("Waist (cm)", 0.0, 200.0, 80.0, key="meas_waist")
-            meas_hip = st.number_input("Hip (cm)", 0.0, 200.0, 90.0, key="meas_hip")
-            meas_chest = st.number_input("Chest (cm)", 0.0, 200.0, 95.0, key="meas_chest")
-            notes = st.text_area("Notes", key="meas_notes")
+    col_p1, col_p2 = st.columns(2)
+    
+    with col_p1:
+        st.write("### Log Measurements")
+        meas_weight = st.number_input("Weight (kg)", 0.0, 500.0, 70.0, key="meas_weight")
+        meas_waist = st.number_input("Waist (cm)", 0.0, 200.0, 80.0, key="meas_waist")
+        meas_hip = st.number_input("Hip (cm)", 0.0, 200.0, 90.0, key="meas_hip")
+        meas_chest = st.number_input("Chest (cm)", 0.0, 200.0, 95.0, key="meas_chest")
+        notes = st.text_area("Notes", key="meas_notes")
+        
+        if st.button("💾 Save Measurements"):
+            progress_data = {
+                'date': st.session_state.current_date,
+                'weight': meas_weight,
+                'waist': meas_waist,
+                'hip': meas_hip,
+                'chest': meas_chest,
+                'notes': notes
+            }
+            save_progress(user_id, progress_data)
+            st.success("✅ Measurements saved!")
+    
+    with col_p2:
+        # Progress history
+        progress_hist = get_progress_history(user_id, 90)
+        if progress_hist:
+            prog_df = pd.DataFrame(progress_hist, columns=['Date', 'Weight'])
+            st.write("### Weight History (90 days)")
+            st.dataframe(prog_df, use_container_width=True)
             
-            if st.button("💾 Save Measurements"):
-                progress_data = {
-                    'date': st.session_state.current_date,
-                    'weight': meas_weight,
-                    'waist': meas_waist,
-                    'hip': meas_hip,
-                    'chest': meas_chest,
-                    'notes': notes
-                }
-                save_progress(user_id, progress_data)
-                st.success("✅ Measurements saved!")
-                st.rerun()
-        
-        with col_p2:
-            # Progress history
-            progress_hist = get_progress_history(user_id, 90)
-            if progress_hist:
-                prog_df = pd.DataFrame(progress_hist, columns=['Date', 'Weight'])
-                st.write("### Weight History (90 days)")
-                st.dataframe(prog_df, use_container_width=True)
-                
-                # Weight chart
+            # Weight chart
+            with span('chart', 'weight_line', rows=len(prog_df)):
+                import plotly.express as px
                 fig = px.line(prog_df, x='Date', y='Weight', title='Weight Progress',
                              markers=True)
                 st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("No measurements yet. Start logging today!")
+        else:
+            st.info("No measurements yet. Start logging today!")
+
+
+# TAB 5: HEALTH METRICS
+@tab_fragment
+def render_health_metrics_tab(weight, height_m, age, gender, activity, bmi):
+    st.subheader("🏥 Health Metrics Calculator")
     
-    # TAB 5: HEALTH METRICS
-    with tab5:
-        st.subheader("🏥 Health Metrics Calculator")
-        
-        col_h1, col_h2 = st.columns(2)
-        
-        with col_h1:
-            st.write("### Health Status")
-            st.metric("BMI", f"{calculate_bmi(weight, height_m)}")
-            st.metric("BMR", f"{calculate_tdee(weight, height_m * 100, age, gender, activity)[1]} cal/day")
-            st.metric("Body Fat Est.", f"{calculate_body_fat_estimate(calculate_bmi(weight, height_m), age, gender)}%")
+    col_h1, col_h2 = st.columns(2)
+    
+    with col_h1:
+        st.write("### Health Status")
+        st.metric("BMI", f"{calculate_bmi(weight, height_m)}")
+        st.metric("BMR", f"{calculate_tdee(weight, height_m * 100, age, gender, activity)[1]} cal/day")
+        st.metric("Body Fat Est.", f"{calculate_body_fat_estimate(calculate_bmi(weight, height_m), age, gender)}%")
+    
+    with col_h2:
+        st.write("### Goal Calculations")
+        target_weight = st.number_input("Target Weight (kg)", 0.0, 500.0, 65.0)
+        weeks_to_goal = st.number_input("Weeks to Goal", 1, 104, 12)
         
-        with col_h2:
-            st.write("### Goal Calculations")
-            target_weight = st.number_input("Target Weight (kg)", 0.0, 500.0, 65.0)
-            weeks_to_goal = st.number_input("Weeks to Goal", 1, 104, 12)
-            
-            calorie_deficit = get_calorie_deficit(calculate_tdee(weight, height_m * 100, age, gender, activity)[0], weeks_to_goal)
-            weekly_loss = (weight - target_weight) / weeks_to_goal
-            
-            st.metric("Daily Calorie Target", f"{calorie_deficit} cal")
-            st.metric("Weekly Loss", f"{weekly_loss:.2f} kg/week")
-            st.metric("Total Loss Needed", f"{weight - target_weight:.1f} kg")
+        calorie_deficit = get_calorie_deficit(calculate_tdee(weight, height_m * 100, age, gender, activity)[0], weeks_to_goal)
+        weekly_loss = (weight - target_weight) / weeks_to_goal
         
-        # Macros breakdown
+        st.metric("Daily Calorie Target", f"{calorie_deficit} cal")
+        st.metric("Weekly Loss", f"{weekly_loss:.2f} kg/week")
+        st.metric("Total Loss Needed", f"{weight - target_weight:.1f} kg")
+    
+    # Macros breakdown
+    st.markdown("---")
+    st.write("### Macro Breakdown")
+    protein_pct = st.slider("Protein %", 10, 50, 30)
+    carb_pct = st.slider("Carbs %", 20, 60, 50)
+    fat_pct = 100 - protein_pct - carb_pct
+    
+    macros = get_macro_breakdown(calculate_tdee(weight, height_m * 100, age, gender, activity)[0], 
+                                protein_pct, carb_pct, fat_pct)
+    
+    col_macro1, col_macro2, col_macro3 = st.columns(3)
+    with col_macro1:
+        st.metric("Protein", f"{macros['protein_g']:.0f}g ({protein_pct}%)")
+    with col_macro2:
+        st.metric("Carbs", f"{macros['carbs_g']:.0f}g ({carb_pct}%)")
+    with col_macro3:
+        st.metric("Fats", f"{macros['fat_g']:.0f}g ({fat_pct}%)")
+    
+    # Diet recommendation from similar patients
+    if diet_recommender:
         st.markdown("---")
-        st.write("### Macro Breakdown")
-        protein_pct = st.slider("Protein %", 10, 50, 30)
-        carb_pct = st.slider("Carbs %", 20, 60, 50)
-        fat_pct = 100 - protein_pct - carb_pct
-        
-        macros = get_macro_breakdown(calculate_tdee(weight, height_m * 100, age, gender, activity)[0], 
-                                    protein_pct, carb_pct, fat_pct)
-        
-        col_macro1, col_macro2, col_macro3 = st.columns(3)
-        with col_macro1:
-            st.metric("Protein", f"{macros['protein_g']:.0f}g ({protein_pct}%)")
-        with col_macro2:
-            st.metric("Carbs", f"{macros['carbs_g']:.0f}g ({carb_pct}%)")
-        with col_macro3:
-            st.metric("Fats", f"{macros['fat_g']:.0f}g ({fat_pct}%)")
-    
-    # TAB 6: EDUCATION
-    with tab6:
-        st.subheader("🎓 Nutrition & Health Education")
-        
-        for article in NUTRITION_ARTICLES:
-            with st.expander(f"📚 {article['title']}"):
-                st.write(article['preview'])
-                
-                if st.button(f"Read more: {article['title']}", key=article['title']):
-                    prompt = f"Provide detailed information about: {article['title']}"
-                    response = get_gemini_response(prompt)
-                    st.markdown(response)
-    
-    # TAB 7: SHOPPING LIST
-    with tab7:
-        st.subheader("🛒 Smart Shopping List")
-        
-        col_s1, col_s2 = st.columns(2)
-        
-        with col_s1:
-            st.write("### Generate Shopping List")
-            meals_for_week = st.multiselect("Select meals for the week", [r['name'] for r in SAMPLE_RECIPES])
-            
-            if st.button("📋 Generate Shopping List"):
-                selected_meals = [r for r in SAMPLE_RECIPES if r['name'] in meals_for_week]
-                ingredients = []
-                for meal in selected_meals:
-                    ingredients.extend(meal['ingredients'])
-                
-                st.write("### Shopping List")
-                for ing in sorted(set(ingredients)):
-                    st.write(f"☐ {ing}")
-        
-        with col_s2:
-            st.write("### Budget Planner")
-            budget = st.number_input("Weekly Budget ($)", 0, 500, 100)
-            servings = st.number_input("Number of People", 1, 10, 1)
-            
-            daily_budget = budget / 7 / servings
-            st.metric("Daily Budget per Person", f"${daily_budget:.2f}")
+        st.write("### 🥗 Recommended Diet")
+        col_dr1, col_dr2, col_dr3 = st.columns(3)
+        with col_dr1:
+            condition = st.selectbox("Condition", ["None", "Obesity", "Diabetes", "Hypertension"], key="diet_condition")
+            severity = st.selectbox("Severity", ["Mild", "Moderate", "Severe"], key="diet_severity")
+        with col_dr2:
+            cholesterol = st.number_input("Cholesterol (mg/dL)", 100.0, 400.0, 190.0, key="diet_cholesterol")
+            blood_pressure = st.number_input("Blood Pressure (mmHg)", 80, 220, 120, key="diet_blood_pressure")
+        with col_dr3:
+            glucose = st.number_input("Glucose (mg/dL)", 50.0, 400.0, 100.0, key="diet_glucose")
+            restriction = st.selectbox("Dietary Restriction", ["None", "Low_Sugar", "Low_Sodium"], key="diet_restriction")
+        recommendation = diet_recommender.recommend({
+            'age': age, 'bmi': bmi, 'gender': gender, 'activity_level': activity,
+            'disease_type': condition, 'severity': severity, 'cholesterol': cholesterol,
+            'blood_pressure': blood_pressure, 'glucose': glucose, 'dietary_restrictions': restriction
+        })
+        st.success(f"**{recommendation['diet'].replace('_', ' ')}** diet")
+        st.caption(f"Based on the {diet_recommender.k} most similar patients "
+                   f"({recommendation['confidence']:.0%} agreement)")
+    
+    # Patient cohort explorer
+    if cohort_store:
+        st.markdown("---")
+        st.write("### 🧪 Patient Cohort Explorer")
+        cohort_dimensions = [d for d in COHORT_DIMENSIONS if d != 'Diet_Recommendation']
+        col_c1, col_c2, col_c3 = st.columns(3)
+        with col_c1:
+            cohort_by = st.multiselect("Group by", cohort_dimensions, default=["Disease_Type"], key="cohort_by")
+        with col_c2:
+            cohort_filter = st.selectbox("Filter on", ["(none)"] + cohort_dimensions, key="cohort_filter")
+        with col_c3:
+            cohort_values = []
+            if cohort_filter != "(none)":
+                cohort_values = st.multiselect("Values", cohort_store.categories(cohort_filter), key="cohort_values")
+        filters = {cohort_filter: cohort_values} if cohort_values else None
+        started = datetime.now()
+        cohort_stats = cohort_store.group_by(cohort_by, filters=filters)
+        cohort_mix = cohort_store.mix(cohort_by, filters=filters)
+        elapsed_ms = (datetime.now() - started).total_seconds() * 1000
+        st.dataframe(cohort_stats.rename(columns={'mean_Glucose_mg/dL': 'Avg Glucose',
+                                                  'mean_Adherence_to_Diet_Plan': 'Avg Adherence %'}).round(1),
+                     width="stretch", hide_index=True)
+        st.write("Diet recommendation mix")
+        st.dataframe(cohort_mix.style.format("{:.0%}"), width="stretch")
+        st.caption(f"{int(cohort_stats['count'].sum()):,} of {len(cohort_store):,} patients · {elapsed_ms:.0f} ms")
+
+
+# TAB 6: EDUCATION
+@tab_fragment
+def render_education_tab():
+    st.subheader("🎓 Nutrition & Health Education")
+    
+    for article in NUTRITION_ARTICLES:
+        with st.expander(f"📚 {article['title']}"):
+            st.write(article['preview'])
             
-            st.info(f"💰 Estimated cost per meal: ${daily_budget:.2f}")
+            if st.button(f"Read more: {article['title']}", key=article['title']):
+                prompt = f"Provide detailed information about: {article['title']}"
+                render_stream(stream_gemini_response(prompt))
+
+
+# TAB 7: SHOPPING LIST
+@tab_fragment
+def render_shopping_tab():
+    st.subheader("🛒 Smart Shopping List")
     
-    # TAB 8: FAVORITES
-    with tab8:
-        st.subheader("⭐ Saved Favorites")
-        
-        st.write("### Favorite Recipes")
-        for recipe in SAMPLE_RECIPES[:3]:
-            col_f1, col_f2 = st.columns([3, 1])
-            with col_f1:
-                st.write(f"**{recipe['name']}** - {recipe['calories']} cal")
-            with col_f2:
-                if st.button("❤️", key=f"fav_{recipe['name']}"):
-                    st.success("Added to favorites!")
-    
-    # TAB 9: DASHBOARD
-    with tab9:
-        st.subheader("📊 Weekly Summary Dashboard")
-        
-        # Get 7-day data
-        week_data = []
-        for i in range(7):
-            date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-            totals = get_daily_totals(user_id, date)
-            week_data.append({'Date': date, **totals})
-        
-        week_df = pd.DataFrame(week_data)
+    col_s1, col_s2 = st.columns(2)
+    
+    with col_s1:
+        st.write("### Generate Shopping List")
+        meals_for_week = st.multiselect("Select meals for the week", recipe_catalog.names())
+        
+        if st.button("📋 Generate Shopping List"):
+            st.write("### Shopping List")
+            for ing in recipe_catalog.shopping_list(meals_for_week):
+                st.write(f"☐ {ing}")
+    
+    with col_s2:
+        st.write("### Budget Planner")
+        budget = st.number_input("Weekly Budget ($)", 0, 500, 100)
+        servings = st.number_input("Number of People", 1, 10, 1)
         
-        col_d1, col_d2 = st.columns(2)
+        daily_budget = budget / 7 / servings
+        st.metric("Daily Budget per Person", f"${daily_budget:.2f}")
         
-        with col_d1:
-            st.write("### Calorie Intake (7 days)")
-            fig_cal = px.bar(week_df, x='Date', y='calories', title='Daily Calories')
+        st.info(f"💰 Estimated cost per meal: ${daily_budget:.2f}")
+
+
+# TAB 8: FAVORITES
+@tab_fragment
+def render_favorites_tab():
+    st.subheader("⭐ Saved Favorites")
+    
+    st.write("### Favorite Recipes")
+    for recipe in SAMPLE_RECIPES[:3]:
+        col_f1, col_f2 = st.columns([3, 1])
+        with col_f1:
+            st.write(f"**{recipe['name']}** - {recipe['calories']} cal")
+        with col_f2:
+            if st.button("❤️", key=f"fav_{recipe['name']}"):
+                st.success("Added to favorites!")
+
+
+# TAB 9: DASHBOARD
+@tab_fragment
+def render_dashboard_tab(user_id):
+    st.subheader("📊 Weekly Summary Dashboard")
+    
+    col_r1, col_r2 = st.columns(2)
+    with col_r1:
+        period_days = st.selectbox("Period", [7, 30, 90, 365], format_func=lambda d: f"Last {d} days",
+                                   key="dash_period")
+    with col_r2:
+        granularity = st.selectbox("Group by", ["day", "week", "month"], key="dash_granularity")
+    
+    # One grouped query for the whole period; in daily view its last row is today
+    today = datetime.now().date()
+    range_totals = get_range_totals(user_id, today - timedelta(days=period_days - 1), today, granularity)
+    week_df = pd.DataFrame(range_totals).rename(columns={'date': 'Date'})
+    
+    col_d1, col_d2 = st.columns(2)
+    
+    with col_d1:
+        st.write(f"### Calorie Intake ({period_days} days)")
+        with span('chart', 'calories_bar', rows=len(week_df)):
+            import plotly.express as px
+            fig_cal = px.bar(week_df, x='Date', y='calories', title=f'Calories per {granularity}')
             st.plotly_chart(fig_cal, use_container_width=True)
-        
-        with col_d2:
-            st.write("### Macro Distribution (Today)")
-            daily = get_daily_totals(user_id)
-            macro_data = {'Protein': daily['protein'], 'Carbs': daily['carbs'], 'Fats': daily['fats']}
+    
+    with col_d2:
+        st.write("### Macro Distribution (Today)")
+        daily = range_totals[-1] if granularity == 'day' else get_daily_totals(user_id)
+        macro_data = {'Protein': daily['protein'], 'Carbs': daily['carbs'], 'Fats': daily['fats']}
+        with span('chart', 'macros_pie', rows=len(macro_data)):
             fig_macro = px.pie(values=macro_data.values(), names=macro_data.keys(), title='Macros')
             st.plotly_chart(fig_macro, use_container_width=True)
-        
-        st.markdown("---")
-        st.write("### Export Data")
-        csv_data = export_to_csv(user_id)
-        st.download_button("📥 Download CSV", csv_data, "nutrition_data.csv", "text/csv")
+    
+    st.markdown("---")
+    st.write("### Export Data")
+    export_formats = {"CSV": "csv", "JSONL (gzip, all tables)": "jsonl.gz"}
+    if PARQUET_AVAILABLE:
+        export_formats["Parquet"] = "parquet"
+    col_e1, col_e2 = st.columns(2)
+    with col_e1:
+        export_format = export_formats[st.selectbox("Format", list(export_formats), key="export_format")]
+    with col_e2:
+        export_table = st.selectbox("Table", EXPORT_TABLES, key="export_table",
+                                    disabled=export_format == "jsonl.gz")
+    filename, mime, _ = stream_export(user_id, export_format, export_table)
+
+    def build_export():
+        # Runs only when the button is clicked, so reruns never read the full history
+        return b''.join(stream_export(user_id, export_format, export_table)[2])
+
+    st.download_button("📥 Download Export", build_export, filename, mime, on_click="ignore")
+
 
 # MAIN LOGIC
-if st.session_state.user_id:
-    show_main_app()
-else:
-    st.title("🤖 AI Health Companion")
-    st.markdown("### Your Personal Nutrition & Fitness Coach")
-    show_login_page()
+with perf_run(session_id(), "rerun"):
+    if st.session_state.user_id:
+        show_main_app()
+    else:
+        st.title("🤖 AI Health Companion")
+        st.markdown("### Your Personal Nutrition & Fitness Coach")
+        show_login_page()
+
+if PERF_ENABLED and st.query_params.get("perf") == "1":
+    show_perf_panel()
@@ -0,0 +1,78 @@
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from database import save_meal_logs
+from gemini_client import generate_response
+from image_pipeline import preprocess_image, photo_taken_date
+
+BATCH_CONCURRENCY = int(os.getenv('BATCH_ANALYSIS_CONCURRENCY', '4'))
+
+MEAL_TYPES = ['breakfast', 'lunch', 'dinner', 'snack']
+
+BATCH_ANALYSIS_PROMPT = """Estimate the nutrition of the meal in this photo.
+Reply with a single JSON object and nothing else, using exactly these keys:
+{"food_name": "short description", "meal_type": "breakfast|lunch|dinner|snack",
+ "calories": integer kcal, "protein": grams, "carbs": grams, "fats": grams}"""
+
+
+def parse_nutrition_estimate(text):
+    """Extract and validate the JSON nutrition estimate from a model reply"""
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        raise ValueError("No JSON object in response")
+    data = json.loads(match.group(0))
+    estimate = {
+        'food_name': str(data.get('food_name') or 'Unknown meal').strip()[:100],
+        'meal_type': str(data.get('meal_type', 'snack')).lower(),
+        'calories': int(round(float(data['calories']))),
+        'protein': float(data.get('protein') or 0),
+        'carbs': float(data.get('carbs') or 0),
+        'fats': float(data.get('fats') or 0)
+    }
+    if estimate['meal_type'] not in MEAL_TYPES:
+        estimate['meal_type'] = 'snack'
+    if not 0 <= estimate['calories'] <= 5000:
+        raise ValueError(f"Implausible calorie estimate: {estimate['calories']}")
+    if min(estimate['protein'], estimate['carbs'], estimate['fats']) < 0:
+        raise ValueError("Negative macro estimate")
+    return estimate
+
+
+def analyze_photo(name, data, default_date):
+    """Preprocess, analyse and parse one photo into a meal_data dict"""
+    prepared = preprocess_image(data)
+    image_data = [{"mime_type": prepared['mime_type'], "data": prepared['data']}]
+    meal = parse_nutrition_estimate(generate_response(BATCH_ANALYSIS_PROMPT, image_data))
+    meal['date'] = photo_taken_date(data) or default_date
+    return meal
+
+
+def analyze_photos(photos, default_date, max_workers=BATCH_CONCURRENCY, on_result=None):
+    """Analyse (name, bytes) photos concurrently; one failure never sinks the batch
+
+    Returns one result dict per photo, in input order, with 'name', 'ok'
+    and either 'meal' or 'error'. on_result is called from the calling
+    thread as each photo finishes, e.g. to advance a progress bar.
+    """
+    results = [None] * len(photos)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='photo-batch') as pool:
+        futures = {pool.submit(analyze_photo, name, data, default_date): i
+                   for i, (name, data) in enumerate(photos)}
+        for future in as_completed(futures):
+            i = futures[future]
+            name = photos[i][0]
+            try:
+                results[i] = {'name': name, 'ok': True, 'meal': future.result()}
+            except Exception as e:
+                results[i] = {'name': name, 'ok': False, 'error': str(e)}
+            if on_result:
+                on_result(results[i])
+    return results
+
+
+def log_batch_results(user_id, results):
+    """Write every successful estimate to meal_logs in one transaction"""
+    meals = [result['meal'] for result in results if result['ok']]
+    return save_meal_logs(user_id, meals) if meals else 0
@@ -0,0 +1,422 @@
+"""Synthetic data generator and benchmark harness for the nutrition database
+
+Usage:
+    python benchmark.py run --scales 1k,100k -o report.json
+    python benchmark.py run --scales 10M --iterations 100
+    python benchmark.py compare baseline.json report.json
+    python benchmark.py verify
+
+Each scale is generated once into its own database under NUTRITION_BENCH_DIR
+(reused while the seed and size match) and benchmarked in a fresh process.
+verify runs the correctness checks in VERIFY_CHECKS and exits non-zero if
+any of them fails.
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import platform
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from database import (DB_PATH, init_database, create_user, get_user_id, bulk_save, authenticate_user,
+                      get_daily_totals, get_meal_logs, get_range_totals, get_progress_history)
+from data_export import export_to_csv
+from catalog import load_meals_from_csv, load_workouts_from_csv
+from instrumentation import percentile
+
+BENCH_DIR = os.getenv('NUTRITION_BENCH_DIR', '.bench')
+BENCH_FORMAT_VERSION = 1
+BENCH_PASSWORD = 'bench-password'
+# Label: (users, days of history); about 6.4 rows per user-day across the four log tables
+SCALES = {
+    '1k': (5, 30),
+    '100k': (150, 100),
+    '10M': (4200, 365),
+}
+DEFAULT_SCALES = '1k,100k'
+DEFAULT_ITERATIONS = 200
+WARMUP_ITERATIONS = 10
+
+# Used when meals.csv / workouts.csv are absent, like the app's sample data
+FOODS = [
+    {'name': 'Oatmeal with Berries', 'calories': 320, 'protein': 10, 'carbs': 55, 'fats': 7},
+    {'name': 'Greek Yogurt Parfait', 'calories': 280, 'protein': 18, 'carbs': 35, 'fats': 8},
+    {'name': 'Veggie Omelette', 'calories': 350, 'protein': 24, 'carbs': 8, 'fats': 24},
+    {'name': 'Quinoa Buddha Bowl', 'calories': 450, 'protein': 18, 'carbs': 52, 'fats': 16},
+    {'name': 'Grilled Chicken Salad', 'calories': 380, 'protein': 42, 'carbs': 12, 'fats': 18},
+    {'name': 'Lentil Soup', 'calories': 300, 'protein': 18, 'carbs': 45, 'fats': 5},
+    {'name': 'Salmon with Rice', 'calories': 620, 'protein': 40, 'carbs': 60, 'fats': 22},
+    {'name': 'Beef Stir Fry', 'calories': 560, 'protein': 38, 'carbs': 45, 'fats': 24},
+    {'name': 'Chickpea Curry', 'calories': 480, 'protein': 17, 'carbs': 62, 'fats': 17},
+    {'name': 'Turkey Sandwich', 'calories': 420, 'protein': 30, 'carbs': 44, 'fats': 12},
+    {'name': 'Apple with Peanut Butter', 'calories': 250, 'protein': 7, 'carbs': 28, 'fats': 14},
+    {'name': 'Protein Shake', 'calories': 200, 'protein': 30, 'carbs': 10, 'fats': 4},
+]
+WORKOUTS = [
+    {'name': 'HIIT Training', 'duration': 30, 'calories': 400, 'intensity': 'high'},
+    {'name': 'Running', 'duration': 45, 'calories': 450, 'intensity': 'moderate'},
+    {'name': 'Yoga', 'duration': 60, 'calories': 200, 'intensity': 'low'},
+    {'name': 'Cycling', 'duration': 50, 'calories': 420, 'intensity': 'moderate'},
+    {'name': 'Strength Training', 'duration': 45, 'calories': 300, 'intensity': 'moderate'},
+    {'name': 'Walking', 'duration': 40, 'calories': 160, 'intensity': 'low'},
+]
+MEAL_TYPES = [('Breakfast', 8, 0.25), ('Lunch', 13, 0.35), ('Dinner', 19, 0.3), ('Snack', 16, 0.1)]
+SNACK_PROBABILITY = 0.4
+
+
+# Generator
+def load_profiles(path='diet_recommendations_dataset.csv'):
+    """Patient profiles the synthetic users are drawn from"""
+    df = pd.read_csv(path, usecols=['Age', 'Gender', 'Weight_kg', 'Height_cm', 'BMI',
+                                    'Daily_Caloric_Intake', 'Weekly_Exercise_Hours'])
+    return df.dropna().to_dict('records')
+
+
+def _stamp(day, hour, rng):
+    return (datetime.combine(day, datetime.min.time())
+            + timedelta(hours=hour, minutes=int(rng.integers(0, 60)), seconds=int(rng.integers(0, 60)))).isoformat()
+
+
+def generate_user_rows(profile, days, end_date, rng, foods=FOODS, workouts=WORKOUTS):
+    """Meal, water, workout and progress rows for one user's last `days` days, keyed by table
+
+    Daily intake scatters around the profile's Daily_Caloric_Intake,
+    workouts follow its Weekly_Exercise_Hours and a weekly weigh-in drifts
+    the weight towards a normal BMI.
+    """
+    rows = {'meal_logs': [], 'water_logs': [], 'workout_logs': [], 'progress_tracking': []}
+    food_calories = np.array([food['calories'] for food in foods], dtype=float)
+    sessions_per_day = min(1.0, profile['Weekly_Exercise_Hours'] / 0.75 / 7)
+    weight = float(profile['Weight_kg'])
+    height_m = profile['Height_cm'] / 100
+    trend = -0.25 if profile['BMI'] > 25 else (0.15 if profile['BMI'] < 18.5 else 0.0)
+    weigh_in = int(rng.integers(0, 7))
+
+    for offset in range(days - 1, -1, -1):
+        day = end_date - timedelta(days=offset)
+        date = day.strftime('%Y-%m-%d')
+        intake = profile['Daily_Caloric_Intake'] * rng.normal(1.0, 0.12)
+        for meal_type, hour, share in MEAL_TYPES:
+            if meal_type == 'Snack' and rng.random() > SNACK_PROBABILITY:
+                continue
+            # Prefer foods close to this meal's share of the day, then scale the portion to fit
+            target = intake * share
+            weights = np.exp(-np.abs(food_calories - target) / 150)
+            food = foods[int(rng.choice(len(foods), p=weights / weights.sum()))]
+            portion = float(np.clip(target / food['calories'], 0.5, 2.5))
+            rows['meal_logs'].append({
+                'date': date, 'meal_type': meal_type, 'food_name': food['name'],
+                'calories': int(round(food['calories'] * portion)),
+                'protein': round(food['protein'] * portion, 1),
+                'carbs': round(food['carbs'] * portion, 1),
+                'fats': round(food['fats'] * portion, 1),
+                'created_at': _stamp(day, hour, rng)
+            })
+        cups = max(1.0, rng.normal(7, 2))
+        logs = int(rng.integers(1, 4))
+        for i in range(logs):
+            rows['water_logs'].append({'date': date, 'cups': round(cups / logs * 2) / 2 or 0.5,
+                                       'created_at': _stamp(day, 9 + 4 * i, rng)})
+        if rng.random() < sessions_per_day:
+            workout = workouts[int(rng.integers(0, len(workouts)))]
+            scale = weight / 70 * rng.normal(1.0, 0.1)
+            rows['workout_logs'].append({
+                'date': date, 'exercise': workout['name'],
+                'duration': int(workout['duration'] * rng.choice([0.75, 1.0, 1.0, 1.25])),
+                'calories_burned': max(0, int(workout['calories'] * scale)),
+                'intensity': workout['intensity'], 'created_at': _stamp(day, 18, rng)
+            })
+        if offset % 7 == weigh_in:
+            weight = max(35.0, weight + trend + rng.normal(0, 0.4))
+            rows['progress_tracking'].append({
+                'date': date, 'weight': round(weight, 1),
+                'waist': round(weight / height_m * 0.5 + rng.normal(0, 1), 1),
+                'hip': None, 'chest': None, 'notes': '', 'created_at': _stamp(day, 7, rng)
+            })
+    return rows
+
+
+def bench_username(i):
+    return f"bench{i:06d}"
+
+
+def generate_dataset(users, days, seed=0, end_date=None, progress=None):
+    """Fill the current database with users x days of synthetic history through bulk_save
+
+    Returns the number of rows written per table.
+    """
+    end_date = end_date or datetime.now().date()
+    rng = np.random.default_rng(seed)
+    profiles = load_profiles()
+    foods = load_meals_from_csv() or FOODS
+    workouts = load_workouts_from_csv() or WORKOUTS
+    init_database()
+    counts = {}
+    for i in range(users):
+        username = bench_username(i)
+        create_user(username, BENCH_PASSWORD)
+        user_id = get_user_id(username)
+        profile = profiles[int(rng.integers(0, len(profiles)))]
+        for table, rows in generate_user_rows(profile, days, end_date, rng, foods, workouts).items():
+            counts[table] = counts.get(table, 0) + bulk_save(user_id, table, rows)['inserted']
+        if progress:
+            progress(i + 1, users)
+    return counts
+
+
+def prepare_database(users, days, seed=0):
+    """Generate DB_PATH for this scale unless a matching dataset is already there; returns its meta"""
+    meta_path = f"{DB_PATH}.meta.json"
+    wanted = {'version': BENCH_FORMAT_VERSION, 'users': users, 'days': days, 'seed': seed}
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if all(meta.get(key) == value for key, value in wanted.items()) and os.path.exists(DB_PATH):
+            meta['generated'] = False
+            return meta
+    except (OSError, ValueError):
+        pass
+
+    for suffix in ('', '-wal', '-shm', '.meta.json'):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
+    started = time.perf_counter()
+    end_date = datetime.now().date()
+
+    def progress(done, total):
+        if done % max(1, total // 20) == 0 or done == total:
+            print(f"  generated {done}/{total} users", file=sys.stderr)
+
+    rows = generate_dataset(users, days, seed, end_date, progress)
+    meta = {**wanted, 'end_date': end_date.strftime('%Y-%m-%d'), 'rows': rows,
+            'total_rows': sum(rows.values()), 'generate_s': round(time.perf_counter() - started, 2)}
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    meta['generated'] = True
+    return meta
+
+
+# Harness
+def time_operation(func, argument_sets):
+    """Latency summary (ms) of func over argument_sets after a short warm-up"""
+    for args in argument_sets[:WARMUP_ITERATIONS]:
+        func(*args)
+    samples = []
+    for args in argument_sets:
+        started = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered), 4),
+        'p50_ms': round(percentile(ordered, 50), 4),
+        'p95_ms': round(percentile(ordered, 95), 4),
+        'p99_ms': round(percentile(ordered, 99), 4),
+    }
+
+
+def benchmark_hot_paths(meta, iterations=DEFAULT_ITERATIONS, seed=0):
+    """Time the read paths the app hits on every rerun against the current database
+
+    The get_* functions are called through __wrapped__ so every call reaches
+    SQLite instead of query_cache. Users and dates are drawn with a fixed seed.
+    """
+    rng = random.Random(seed)
+    end_date = datetime.strptime(meta['end_date'], '%Y-%m-%d').date()
+    user_ids = [get_user_id(bench_username(i)) for i in range(meta['users'])]
+    # Keep the 30-day progress window over the generated history even when the dataset is reused later
+    history_days = 30 + (datetime.now().date() - end_date).days
+
+    def user():
+        return rng.choice(user_ids)
+
+    def day():
+        return (end_date - timedelta(days=rng.randrange(meta['days']))).strftime('%Y-%m-%d')
+
+    def week():
+        last = end_date - timedelta(days=rng.randrange(meta['days']))
+        return last - timedelta(days=6), last
+
+    def login():
+        i = rng.randrange(meta['users'])
+        return bench_username(i), BENCH_PASSWORD if rng.random() < 0.9 else 'wrong-password'
+
+    operations = {
+        'get_daily_totals': (get_daily_totals.__wrapped__, lambda: (user(), day())),
+        'get_meal_logs': (get_meal_logs.__wrapped__, lambda: (user(), day())),
+        'get_range_totals_7d': (get_range_totals.__wrapped__, lambda: (user(), *week())),
+        'get_progress_history': (get_progress_history.__wrapped__, lambda: (user(), history_days)),
+        'export_to_csv': (export_to_csv, lambda: (user(),)),
+        'authenticate_user': (authenticate_user, login),
+    }
+    results = {}
+    for name, (func, make_args) in operations.items():
+        # The full-history export is much heavier than the others
+        n = max(WARMUP_ITERATIONS, iterations // 10) if name == 'export_to_csv' else iterations
+        results[name] = time_operation(func, [make_args() for _ in range(n)])
+    return results
+
+
+def run_scale(label, users, days, iterations, seed):
+    meta = prepare_database(users, days, seed)
+    started = time.perf_counter()
+    operations = benchmark_hot_paths(meta, iterations, seed)
+    return {
+        'scale': label,
+        'users': users,
+        'days': days,
+        'rows': meta['rows'],
+        'total_rows': meta['total_rows'],
+        'db_bytes': sum(os.path.getsize(DB_PATH + s) for s in ('', '-wal') if os.path.exists(DB_PATH + s)),
+        'generate_s': meta['generate_s'] if meta['generated'] else None,
+        'benchmark_s': round(time.perf_counter() - started, 2),
+        'operations': operations,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales, iterations=DEFAULT_ITERATIONS, seed=0):
+    """Benchmark each scale in a child process with NUTRITION_DB_PATH pointed at its dataset"""
+    report = {
+        'format': BENCH_FORMAT_VERSION,
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        'seed': seed,
+        'iterations': iterations,
+        'scales': [],
+    }
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    for label in scales:
+        users, days = SCALES[label]
+        print(f"⏱️ {label}: {users} users x {days} days", file=sys.stderr)
+        env = {**os.environ, 'NUTRITION_DB_PATH': os.path.join(BENCH_DIR, f"bench-{label}-seed{seed}.db"),
+               'NUTRITION_PERF': '0'}
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), 'scale', label,
+                              '--iterations', str(iterations), '--seed', str(seed)],
+                             env=env, stdout=subprocess.PIPE, text=True, check=True).stdout
+        report['scales'].append(json.loads(out.strip().splitlines()[-1]))
+    return report
+
+
+def compare_reports(baseline, current, threshold=1.25, min_delta_ms=0.05):
+    """(scale, operation, old p50, new p50, ratio, regressed) for operations present in both reports
+
+    A regression needs the p50 to grow by more than threshold and by more
+    than min_delta_ms, so timer noise on microsecond lookups isn't flagged.
+    """
+    old = {(s['scale'], op): stats for s in baseline['scales'] for op, stats in s['operations'].items()}
+    rows = []
+    for scale in current['scales']:
+        for op, stats in scale['operations'].items():
+            before = old.get((scale['scale'], op))
+            if before is None:
+                continue
+            ratio = stats['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+            regressed = ratio > threshold and stats['p50_ms'] - before['p50_ms'] > min_delta_ms
+            rows.append((scale['scale'], op, before['p50_ms'], stats['p50_ms'], ratio, regressed))
+    return rows
+
+
+# Correctness checks that gate a performance change; each script exits non-zero on failure
+VERIFY_CHECKS = [
+    ('query plans use indexes', ['database.py', 'check-plans']),
+    ('batch health metrics match the scalar ones', ['health_metrics.py', '--scale', '10']),
+]
+
+
+def run_verification():
+    """Run every VERIFY_CHECKS script against a fresh database and return the labels that failed"""
+    db_path = os.path.abspath(os.path.join(BENCH_DIR, 'verify.db'))
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    env = {**os.environ, 'NUTRITION_DB_PATH': db_path, 'NUTRITION_PERF': '0'}
+    here = os.path.dirname(os.path.abspath(__file__))
+    failed = []
+    for label, script in VERIFY_CHECKS:
+        print(f"🔎 {label}", file=sys.stderr)
+        if subprocess.run([sys.executable, *script], env=env, cwd=here).returncode:
+            failed.append(label)
+    return failed
+
+
+def print_report(report):
+    for scale in report['scales']:
+        generated = f", generated in {scale['generate_s']}s" if scale['generate_s'] is not None else ''
+        print(f"{scale['scale']}: {scale['total_rows']:,} rows, {scale['users']} users x {scale['days']} days, "
+              f"{scale['db_bytes'] / 1e6:.1f} MB{generated}")
+        for op, stats in scale['operations'].items():
+            print(f"    {op:<22} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+                  f"p99 {stats['p99_ms']:9.3f} ms  (n={stats['n']})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic history and benchmark the database hot paths')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_cmd = sub.add_parser('run', help='benchmark one or more scales and write a JSON report')
+    run_cmd.add_argument('--scales', default=DEFAULT_SCALES, help=f"comma separated, from {', '.join(SCALES)}")
+    run_cmd.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    run_cmd.add_argument('--seed', type=int, default=0)
+    run_cmd.add_argument('-o', '--output', default='benchmark_report.json')
+    scale_cmd = sub.add_parser('scale', help='benchmark one scale against NUTRITION_DB_PATH (used by run)')
+    scale_cmd.add_argument('label', choices=sorted(SCALES))
+    scale_cmd.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    scale_cmd.add_argument('--seed', type=int, default=0)
+    compare_cmd = sub.add_parser('compare', help='compare p50 latencies of two reports')
+    compare_cmd.add_argument('baseline')
+    compare_cmd.add_argument('current')
+    compare_cmd.add_argument('--threshold', type=float, default=1.25,
+                             help='fail when a p50 grows by more than this factor')
+    compare_cmd.add_argument('--min-delta-ms', type=float, default=0.05,
+                             help='ignore p50 increases smaller than this')
+    sub.add_parser('verify', help='run the query plan and correctness checks; fails if any check fails')
+    args = parser.parse_args()
+
+    if args.command == 'scale':
+        users, days = SCALES[args.label]
+        print(json.dumps(run_scale(args.label, users, days, args.iterations, args.seed)))
+    elif args.command == 'run':
+        scales = [label.strip() for label in args.scales.split(',') if label.strip()]
+        unknown = [label for label in scales if label not in SCALES]
+        if unknown:
+            raise SystemExit(f"❌ Unknown scale(s): {', '.join(unknown)}")
+        report = run_benchmarks(scales, args.iterations, args.seed)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print_report(report)
+        print(f"✅ Wrote {args.output}")
+    elif args.command == 'verify':
+        failed = run_verification()
+        if failed:
+            raise SystemExit(f"❌ Failed checks: {', '.join(failed)}")
+        print(f"✅ All {len(VERIFY_CHECKS)} checks passed")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare_reports(baseline, current, args.threshold, args.min_delta_ms)
+        for scale, op, before, after, ratio, regressed in rows:
+            print(f"{'REGRESSION' if regressed else 'ok':<10} {scale:>5} {op:<22} "
+                  f"{before:9.3f} -> {after:9.3f} ms  ({ratio:.2f}x)")
+        if any(row[-1] for row in rows):
+            raise SystemExit(1)
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+from catalog import CATALOG_CACHE_DIR
+from instrumentation import span
+
+STORE_FORMAT_VERSION = 1
+CONVERT_CHUNK_SIZE = 250_000
+MISSING_CATEGORY = 'None'
+
+COHORT_DIMENSIONS = ['Gender', 'Disease_Type', 'Severity', 'Physical_Activity_Level', 'Dietary_Restrictions',
+                     'Allergies', 'Preferred_Cuisine', 'Diet_Recommendation']
+COHORT_MEASURES = {
+    'Age': 'int16',
+    'Weight_kg': 'float32',
+    'Height_cm': 'int16',
+    'BMI': 'float32',
+    'Daily_Caloric_Intake': 'int32',
+    'Cholesterol_mg/dL': 'float32',
+    'Blood_Pressure_mmHg': 'int16',
+    'Glucose_mg/dL': 'float32',
+    'Weekly_Exercise_Hours': 'float32',
+    'Adherence_to_Diet_Plan': 'float32',
+    'Dietary_Nutrient_Imbalance_Score': 'float32',
+}
+CODE_DTYPE = 'int16'
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _column_file(directory, column):
+    # Column names like 'Glucose_mg/dL' are not valid file names
+    return os.path.join(directory, column.replace('/', '_per_') + '.bin')
+
+
+# Conversion
+def convert_csv(path, directory, chunk_size=CONVERT_CHUNK_SIZE):
+    """Convert the dataset CSV into one typed binary file per column plus meta.json
+
+    Dimensions are stored as int16 codes into a per-column category list,
+    measures in the narrowest dtype that holds them. The CSV is read in
+    chunks so conversion memory stays flat however many rows there are.
+    """
+    st = os.stat(path)
+    tmp = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    categories = {column: {} for column in COHORT_DIMENSIONS}
+    files = {column: open(_column_file(tmp, column), 'wb') for column in [*COHORT_DIMENSIONS, *COHORT_MEASURES]}
+    rows = 0
+    try:
+        for chunk in pd.read_csv(path, usecols=[*COHORT_DIMENSIONS, *COHORT_MEASURES], chunksize=chunk_size):
+            for column in COHORT_DIMENSIONS:
+                codes, uniques = pd.factorize(chunk[column].fillna(MISSING_CATEGORY).astype(str))
+                # Map this chunk's local codes onto the store-wide category list
+                known = categories[column]
+                remap = np.array([known.setdefault(value, len(known)) for value in uniques], dtype=CODE_DTYPE)
+                files[column].write(remap[codes].tobytes())
+            for column, dtype in COHORT_MEASURES.items():
+                files[column].write(chunk[column].to_numpy(dtype=dtype).tobytes())
+            rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+    meta = {
+        'version': STORE_FORMAT_VERSION,
+        'stamp': [st.st_mtime_ns, st.st_size],
+        'rows': rows,
+        'dtypes': {**{column: CODE_DTYPE for column in COHORT_DIMENSIONS}, **COHORT_MEASURES},
+        'categories': {column: list(known) for column, known in categories.items()},
+    }
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    return meta
+
+
+# Column Store
+class ColumnStore:
+    """Memory-mapped columns of the converted dataset with vectorized filters and group-bys
+
+    Only the columns a query touches are paged in, and group-bys run as a
+    single np.bincount over combined category codes, so queries stay well
+    under a second on millions of rows.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.rows = self.meta['rows']
+        self._columns = {}
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        """The raw column: category codes for dimensions, values for measures"""
+        if name not in self._columns:
+            if name not in self.meta['dtypes']:
+                raise KeyError(f"Unknown cohort column: {name}")
+            if self.rows == 0:
+                self._columns[name] = np.zeros(0, dtype=self.meta['dtypes'][name])
+            else:
+                self._columns[name] = np.memmap(_column_file(self.directory, name), self.meta['dtypes'][name],
+                                                mode='r', shape=(self.rows,))
+        return self._columns[name]
+
+    def categories(self, dimension):
+        return self.meta['categories'][dimension]
+
+    def mask(self, filters=None):
+        """Boolean row mask for {dimension: value or [values]} and {measure: (low, high)} filters"""
+        selected = np.ones(self.rows, dtype=bool)
+        for name, wanted in (filters or {}).items():
+            if name in COHORT_DIMENSIONS:
+                values = [wanted] if isinstance(wanted, str) else list(wanted)
+                lookup = {category: i for i, category in enumerate(self.categories(name))}
+                codes = [lookup[v] for v in values if v in lookup]
+                selected &= np.isin(self.column(name), codes)
+            else:
+                low, high = wanted
+                data = self.column(name)
+                if low is not None:
+                    selected &= data >= low
+                if high is not None:
+                    selected &= data <= high
+        return selected
+
+    def _group_keys(self, dimensions, selected):
+        sizes = [len(self.categories(d)) for d in dimensions]
+        keys = np.zeros(int(selected.sum()), dtype=np.int64)
+        for dimension, size in zip(dimensions, sizes):
+            keys = keys * size + self.column(dimension)[selected]
+        return keys, sizes
+
+    def group_by(self, dimensions, measures=('Glucose_mg/dL', 'Adherence_to_Diet_Plan'), filters=None):
+        """DataFrame of row count and mean of each measure per combination of dimensions"""
+        dimensions = list(dimensions)
+        selected = self.mask(filters)
+        keys, sizes = self._group_keys(dimensions, selected)
+        groups = int(np.prod(sizes)) if sizes else 1
+        counts = np.bincount(keys, minlength=groups)
+        present = np.flatnonzero(counts)
+        result = {}
+        for dimension, codes in zip(dimensions, np.unravel_index(present, sizes) if sizes else []):
+            result[dimension] = np.array(self.categories(dimension), dtype=object)[codes]
+        result['count'] = counts[present]
+        for measure in measures:
+            sums = np.bincount(keys, weights=self.column(measure)[selected], minlength=groups)
+            result[f"mean_{measure}"] = sums[present] / counts[present]
+        return pd.DataFrame(result)
+
+    def mix(self, dimensions, column='Diet_Recommendation', filters=None):
+        """Share of each value of column within every group, one column per value"""
+        dimensions = list(dimensions)
+        counts = self.group_by([*dimensions, column], measures=(), filters=filters)
+        if counts.empty:
+            return counts
+        if not dimensions:
+            return (counts.set_index(column)['count'] / counts['count'].sum()).to_frame('share').T
+        table = counts.pivot_table(index=dimensions, columns=column, values='count', fill_value=0, observed=True)
+        return table.div(table.sum(axis=1), axis=0)
+
+
+def open_cohort_store(path='diet_recommendations_dataset.csv'):
+    """ColumnStore for the dataset, converting it once and again only when the CSV changes"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = [st.st_mtime_ns, st.st_size]
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+    if store and store.meta['stamp'] == stamp:
+        return store
+
+    name = hashlib.sha1(key.encode()).hexdigest()[:12]
+    directory = os.path.join(CATALOG_CACHE_DIR, f"cohort-{name}")
+    with span('csv_load', 'cohort', bytes=st.st_size) as event:
+        event['source'] = 'compiled'
+        try:
+            store = ColumnStore(directory)
+            if store.meta['version'] != STORE_FORMAT_VERSION or store.meta['stamp'] != stamp:
+                store = None
+        except (OSError, ValueError, KeyError):
+            store = None
+        if store is None:
+            event['source'] = 'parsed'
+            convert_csv(path, directory)
+            store = ColumnStore(directory)
+    with _stores_lock:
+        _stores[key] = store
+    return store
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark cohort queries on the columnar store against pandas')
+    parser.add_argument('path', nargs='?', default='diet_recommendations_dataset.csv')
+    parser.add_argument('--rows', type=int, default=0,
+                        help='first resample the dataset to this many rows into a temporary CSV')
+    args = parser.parse_args()
+
+    path = args.path
+    if args.rows:
+        import tempfile
+        source = pd.read_csv(args.path)
+        path = os.path.join(tempfile.mkdtemp(), f"cohort-{args.rows}.csv")
+        rng = np.random.default_rng(0)
+        for start in range(0, args.rows, CONVERT_CHUNK_SIZE):
+            sample = source.iloc[rng.integers(0, len(source), min(CONVERT_CHUNK_SIZE, args.rows - start))]
+            sample.to_csv(path, mode='a', header=start == 0, index=False)
+
+    def timed(label, func):
+        started = time.perf_counter()
+        result = func()
+        print(f"{label:<44} {(time.perf_counter() - started) * 1000:9.1f} ms")
+        return result
+
+    store = timed('convert (first open)', lambda: open_cohort_store(path))
+    _stores.clear()
+    store = timed('reopen (memory-mapped)', lambda: open_cohort_store(path))
+    df = timed('pandas read_csv', lambda: pd.read_csv(path))
+    print(f"{len(store):,} rows")
+
+    by = ['Disease_Type', 'Severity']
+    where = {'Physical_Activity_Level': 'Sedentary', 'Preferred_Cuisine': ['Indian', 'Italian']}
+    grouped = timed('store: group_by disease x severity', lambda: store.group_by(by))
+    timed('pandas: groupby disease x severity',
+          lambda: df.fillna({'Disease_Type': MISSING_CATEGORY}).groupby(by)[['Glucose_mg/dL', 'Adherence_to_Diet_Plan']].mean())
+    timed('store: filtered group_by', lambda: store.group_by(by, filters=where))
+    timed('store: diet mix by restriction', lambda: store.mix(['Dietary_Restrictions']))
+    expected = df.fillna({'Disease_Type': MISSING_CATEGORY}).groupby(by)['Glucose_mg/dL'].mean()
+    actual = grouped.set_index(by)['mean_Glucose_mg/dL']
+    assert np.allclose(actual.sort_index(), expected.sort_index(), rtol=1e-5), "store disagrees with pandas"
+    print(grouped.to_string(index=False))
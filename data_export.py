@@ -0,0 +1,156 @@
+import io
+import csv
+import gzip
+import json
+import argparse
+
+from database import get_connection, get_user_id, water_buffer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EXPORT_TABLES = ['meal_logs', 'water_logs', 'workout_logs', 'progress_tracking', 'goals']
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl.gz': ('application/gzip', 'jsonl.gz'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_chunks(user_id, table, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield (columns, rows) for the user's rows in table, chunk_size rows at a time"""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown export table: {table}")
+    if table == 'water_logs':
+        water_buffer.flush(user_id)
+    order = 'id' if table == 'goals' else 'date, id'
+    with get_connection() as conn:
+        cur = conn.execute(f'SELECT * FROM {table} WHERE user_id=? ORDER BY {order}', (user_id,))
+        columns = [d[0] for d in cur.description]
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield columns, rows
+
+
+def export_csv(user_id, table='meal_logs'):
+    """Yield one table's history as CSV bytes"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in iter_chunks(user_id, table):
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if not header_written:
+        with get_connection() as conn:
+            columns = [d[0] for d in conn.execute(f'SELECT * FROM {table} LIMIT 0').description]
+        writer.writerow(columns)
+        yield buffer.getvalue().encode()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents are handed out and discarded as we go"""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def export_jsonl_gz(user_id, tables=EXPORT_TABLES):
+    """Yield every table's history as gzip-compressed JSON lines tagged with 'table'"""
+    sink = _DrainableSink()
+    with gzip.GzipFile(fileobj=sink, mode='wb') as gz:
+        for table in tables:
+            for columns, rows in iter_chunks(user_id, table):
+                lines = ''.join(json.dumps({'table': table, **dict(zip(columns, row))}) + '\n' for row in rows)
+                gz.write(lines.encode())
+                data = sink.drain()
+                if data:
+                    yield data
+    yield sink.drain()
+
+
+SQLITE_TO_ARROW = {'INTEGER': 'int64', 'REAL': 'float64', 'TEXT': 'string'}
+
+
+def export_parquet(user_id, table='meal_logs'):
+    """Yield one table's history as Parquet bytes, one row group per chunk"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    with get_connection() as conn:
+        declared = conn.execute(f'PRAGMA table_info({table})').fetchall()
+    schema = pa.schema([(col[1], getattr(pa, SQLITE_TO_ARROW.get(col[2].upper(), 'string'))())
+                        for col in declared])
+    sink = _DrainableSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for columns, rows in iter_chunks(user_id, table):
+            batch = pa.Table.from_arrays([pa.array(col, type=schema.field(name).type)
+                                          for name, col in zip(columns, zip(*rows))], schema=schema)
+            writer.write_table(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def stream_export(user_id, fmt, table='meal_logs'):
+    """Return (filename, mime type, byte chunk generator) for an export
+
+    jsonl.gz always covers every table; csv and parquet export one table.
+    """
+    mime, extension = EXPORT_FORMATS[fmt]
+    if fmt == 'jsonl.gz':
+        return f"nutrition_history.{extension}", mime, export_jsonl_gz(user_id)
+    if fmt == 'parquet':
+        return f"{table}.{extension}", mime, export_parquet(user_id, table)
+    return f"{table}.{extension}", mime, export_csv(user_id, table)
+
+
+def export_to_csv(user_id):
+    """Full meal history as CSV bytes"""
+    return b''.join(export_csv(user_id, 'meal_logs'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a user's full history")
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='jsonl.gz')
+    parser.add_argument('--table', choices=EXPORT_TABLES, default='meal_logs',
+                        help='table for csv/parquet (jsonl.gz exports all tables)')
+    parser.add_argument('-o', '--output', help='output file (default: generated name)')
+    args = parser.parse_args()
+
+    user_id = get_user_id(args.user)
+    if user_id is None:
+        raise SystemExit(f"❌ Unknown user: {args.user}")
+    filename, _, chunks = stream_export(user_id, args.format, args.table)
+    output = args.output or filename
+    size = 0
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+    print(f"✅ Wrote {size:,} bytes to {output}")
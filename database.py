@@ -0,0 +1,928 @@
+import os
+import math
+import queue
+import sqlite3
+import threading
+import hashlib
+import atexit
+import copy
+import functools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from instrumentation import connection_factory
+
+DB_PATH = os.getenv('NUTRITION_DB_PATH', 'nutrition_app.db')
+POOL_SIZE = int(os.getenv('NUTRITION_DB_POOL_SIZE', '8'))
+QUERY_CACHE_SIZE = int(os.getenv('NUTRITION_QUERY_CACHE_SIZE', '2048'))
+QUERY_CACHE_TTL = float(os.getenv('NUTRITION_QUERY_CACHE_TTL', '300'))
+# Storage settings are overridable so loadtest.py can compare them under contention
+JOURNAL_MODE = os.getenv('NUTRITION_DB_JOURNAL_MODE', 'WAL')
+SYNCHRONOUS = os.getenv('NUTRITION_DB_SYNCHRONOUS', 'NORMAL')
+BUSY_TIMEOUT_MS = int(os.getenv('NUTRITION_DB_BUSY_TIMEOUT_MS', '5000'))
+# Water increments are held this long and merged per (user, date); 0 writes every click immediately
+WATER_FLUSH_SECONDS = float(os.getenv('NUTRITION_WATER_FLUSH_SECONDS', '2.0'))
+
+# Applied to every pooled connection. WAL lets readers and the single writer
+# run concurrently; synchronous=NORMAL is durable under WAL except on power loss.
+PRAGMAS = [
+    f'PRAGMA journal_mode={JOURNAL_MODE}',
+    f'PRAGMA synchronous={SYNCHRONOUS}',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA temp_store=MEMORY',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+]
+
+
+# Connection Pool
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections"""
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE, timeout=30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        # Streamlit runs each rerun on its own thread, so connections are
+        # handed between threads; the pool guarantees one user at a time.
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False,
+                               factory=connection_factory())
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"no database connection available after {self.timeout}s")
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection must not go back into the pool
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the block"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Check out a connection and commit on success, roll back on error"""
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def close_all(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+                atexit.register(_pool.close_all)
+    return _pool
+
+
+def get_connection():
+    return get_pool().connection()
+
+
+def transaction():
+    return get_pool().transaction()
+
+
+# Schema Migrations
+# Each step runs once, in order, inside its own transaction and records its
+# version in schema_version. Steps must stay idempotent (IF NOT EXISTS) so a
+# database created before versioning existed upgrades cleanly.
+def _migration_001_base_tables(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                 (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password_hash TEXT, created_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS health_profiles
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, profile_data TEXT, created_at TEXT, updated_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS meal_logs
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, meal_type TEXT, food_name TEXT,
+                  calories INTEGER, protein REAL, carbs REAL, fats REAL, created_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS water_logs
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, cups REAL, created_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS workout_logs
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, exercise TEXT, duration INTEGER,
+                  calories_burned INTEGER, intensity TEXT, created_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS progress_tracking
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, weight REAL, waist REAL,
+                  hip REAL, chest REAL, notes TEXT, created_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS favorites
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, item_type TEXT, item_data TEXT, created_at TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS goals
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, goal_text TEXT, target_value REAL,
+                  target_date TEXT, achieved INTEGER, created_at TEXT)''')
+
+def _migration_002_user_date_indexes(c):
+    # Trailing columns make the aggregate and history reads index-only
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_meal_logs_user_date
+                 ON meal_logs (user_id, date, calories, protein, carbs, fats)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_water_logs_user_date
+                 ON water_logs (user_id, date, cups)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_workout_logs_user_date
+                 ON workout_logs (user_id, date, exercise, duration, calories_burned)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_progress_tracking_user_date
+                 ON progress_tracking (user_id, date, weight)''')
+
+# daily_summary holds one row per (user_id, date) with the day's totals. The
+# raw log tables keep it current through triggers, so every write path
+# (including future bulk loaders) updates it in the writer's own transaction.
+ROLLUP_COLUMNS = ['calories', 'protein', 'carbs', 'fats', 'water', 'calories_burned']
+ROLLUP_SOURCES = {
+    'meal_logs': {'calories': 'calories', 'protein': 'protein', 'carbs': 'carbs', 'fats': 'fats'},
+    'water_logs': {'water': 'cups'},
+    'workout_logs': {'calories_burned': 'calories_burned'},
+}
+
+def _rollup_upsert(table, row, sign):
+    columns = ROLLUP_SOURCES[table]
+    values = ', '.join(f"{sign}COALESCE({row}.{src}, 0)" for src in columns.values())
+    updates = ', '.join(f"{col} = {col} + excluded.{col}" for col in columns)
+    return (f"INSERT INTO daily_summary (user_id, date, {', '.join(columns)}) "
+            f"VALUES ({row}.user_id, {row}.date, {values}) "
+            f"ON CONFLICT (user_id, date) DO UPDATE SET {updates};")
+
+def _rollup_source_select():
+    parts = []
+    for table, columns in ROLLUP_SOURCES.items():
+        exprs = ', '.join(f"COALESCE({columns[col]}, 0) AS {col}" if col in columns else f"0 AS {col}"
+                          for col in ROLLUP_COLUMNS)
+        parts.append(f"SELECT user_id, date, {exprs} FROM {table}")
+    sums = ', '.join(f"SUM({col}) AS {col}" for col in ROLLUP_COLUMNS)
+    return f"SELECT user_id, date, {sums} FROM ({' UNION ALL '.join(parts)}) GROUP BY user_id, date"
+
+def _migration_003_daily_summary(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS daily_summary
+                 (user_id INTEGER NOT NULL, date TEXT NOT NULL,
+                  calories INTEGER NOT NULL DEFAULT 0, protein REAL NOT NULL DEFAULT 0,
+                  carbs REAL NOT NULL DEFAULT 0, fats REAL NOT NULL DEFAULT 0,
+                  water REAL NOT NULL DEFAULT 0, calories_burned INTEGER NOT NULL DEFAULT 0,
+                  PRIMARY KEY (user_id, date)) WITHOUT ROWID''')
+    for table in ROLLUP_SOURCES:
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_insert AFTER INSERT ON {table} "
+                  f"BEGIN {_rollup_upsert(table, 'NEW', '')} END")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_delete AFTER DELETE ON {table} "
+                  f"BEGIN {_rollup_upsert(table, 'OLD', '-')} END")
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_rollup_update AFTER UPDATE ON {table} "
+                  f"BEGIN {_rollup_upsert(table, 'OLD', '-')} {_rollup_upsert(table, 'NEW', '')} END")
+    rebuild_daily_summary(c)
+
+def rebuild_daily_summary(c):
+    """Recompute every daily_summary row from the raw log tables"""
+    c.execute('DELETE FROM daily_summary')
+    c.execute(f"INSERT INTO daily_summary (user_id, date, {', '.join(ROLLUP_COLUMNS)}) {_rollup_source_select()}")
+
+def verify_daily_summary(c):
+    """Return (source, row) pairs where daily_summary disagrees with the raw logs
+
+    source is 'raw' for the value the logs imply and 'rollup' for what is
+    stored; an empty list means no drift.
+    """
+    rounded = ', '.join(f"ROUND({col}, 3)" for col in ROLLUP_COLUMNS)
+    # A day whose rows were all deleted keeps an all-zero rollup row; that is not drift
+    nonzero = ' OR '.join(f"ROUND({col}, 3) != 0" for col in ROLLUP_COLUMNS)
+    sql = f'''WITH expected AS (SELECT user_id, date, {rounded} FROM ({_rollup_source_select()}) WHERE {nonzero}),
+                   actual AS (SELECT user_id, date, {rounded} FROM daily_summary WHERE {nonzero})
+              SELECT 'raw', * FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual)
+              UNION ALL
+              SELECT 'rollup', * FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected)
+              ORDER BY 2, 3, 1'''
+    return [(row[0], row[1:]) for row in c.execute(sql)]
+
+def _migration_004_jobs(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS jobs
+                 (id INTEGER PRIMARY KEY, user_id INTEGER, kind TEXT, title TEXT, payload TEXT,
+                  input_blob BLOB, status TEXT, result TEXT, error TEXT,
+                  created_at TEXT, started_at TEXT, finished_at TEXT)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user_created ON jobs (user_id, created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)')
+
+def _migration_005_job_leases(c):
+    # ALTER TABLE has no IF NOT EXISTS; check the columns so the step stays idempotent
+    columns = {row[1] for row in c.execute('PRAGMA table_info(jobs)')}
+    if 'owner' not in columns:
+        c.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+    if 'lease_until' not in columns:
+        c.execute('ALTER TABLE jobs ADD COLUMN lease_until REAL')
+
+MIGRATIONS = [
+    (1, 'base tables', _migration_001_base_tables),
+    (2, 'composite (user_id, date) indexes', _migration_002_user_date_indexes),
+    (3, 'daily_summary rollup and triggers', _migration_003_daily_summary),
+    (4, 'background jobs', _migration_004_jobs),
+    (5, 'job owner and lease', _migration_005_job_leases),
+]
+
+def get_schema_version(conn):
+    row = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='schema_version'").fetchone()
+    if row is None:
+        return 0
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def migrate(conn, target=None):
+    """Apply pending migrations up to target (default: latest), return versions applied"""
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                        (version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT)''')
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        # BEGIN IMMEDIATE serializes concurrent migrators; re-check inside the lock
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            step(conn.cursor())
+            conn.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                         (version, description, datetime.now().isoformat()))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+# Hot read paths that must be answered from an index, never a full table scan
+QUERY_PLAN_CHECKS = [
+    ('get_meal_logs', 'SELECT * FROM meal_logs WHERE user_id=? AND date=? ORDER BY created_at DESC', (1, '2024-01-01')),
+    ('get_daily_totals', 'SELECT calories, protein, carbs, fats FROM daily_summary WHERE user_id=? AND date=?', (1, '2024-01-01')),
+    ('get_water_intake', 'SELECT water FROM daily_summary WHERE user_id=? AND date=?', (1, '2024-01-01')),
+    ('get_range_totals', 'SELECT date, calories FROM daily_summary WHERE user_id=? AND date BETWEEN ? AND ?', (1, '2024-01-01', '2024-12-31')),
+    ('get_progress_history', 'SELECT date, weight FROM progress_tracking WHERE user_id=? AND date>=? ORDER BY date', (1, '2024-01-01')),
+    ('get_workout_history', 'SELECT date, exercise, duration, calories_burned FROM workout_logs WHERE user_id=? AND date>=? ORDER BY date', (1, '2024-01-01')),
+]
+
+def check_query_plans(conn):
+    """Return (name, plan detail) for every checked query that falls back to a full scan"""
+    failures = []
+    for name, sql, params in QUERY_PLAN_CHECKS:
+        for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params):
+            detail = row[-1]
+            if detail.startswith('SCAN'):
+                failures.append((name, detail))
+    return failures
+
+
+# Database initialization
+def init_database():
+    with get_connection() as conn:
+        migrate(conn)
+
+
+# Query Cache
+class QueryCache:
+    """Bounded LRU cache for per-user reads, invalidated by writes
+
+    Each entry records the user, the tables it read and the inclusive date
+    range it covers, so a write for (user_id, date, table) drops exactly the
+    entries that could have changed. The cache is per process; the TTL bounds
+    staleness from writers in other processes.
+    """
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (self.ttl and time.monotonic() - entry[0] > self.ttl):
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, copy.deepcopy(entry[-1])
+
+    def put(self, key, user_id, tables, start, end, value, generation):
+        with self._lock:
+            # A write for this user landed while we were reading; don't cache a stale result
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._entries[key] = (time.monotonic(), user_id, tables, start, end, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id, date, table):
+        """Drop the user's entries for table covering date (every date if date is None)"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            stale = [key for key, (_, uid, tables, start, end, _) in self._entries.items()
+                     if uid == user_id and table in tables and (date is None or start <= date <= end)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+query_cache = QueryCache()
+
+
+# Write Coalescing
+class WriteBuffer:
+    """Write-behind buffer that merges water increments per (user_id, date)
+
+    add() only updates memory. A background thread writes every (user_id,
+    date) pending for flush_interval as one upsert into that day's latest
+    water_logs row, all due keys in a single transaction. flush() writes
+    immediately and runs on logout, before exports and at interpreter exit.
+    read() pairs a database read with the pending increments so a session
+    always sees its own writes, even while a flush is committing.
+    """
+
+    def __init__(self, flush_interval=WATER_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._flushing = False
+        self._epoch = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {'increments': 0, 'flushes': 0, 'upserts': 0, 'inserted_rows': 0, 'failed_flushes': 0}
+
+    @property
+    def enabled(self):
+        return self.flush_interval > 0
+
+    def add(self, user_id, date, cups):
+        with self._cond:
+            entry = self._pending.setdefault((user_id, date), [0.0, time.monotonic(), 0])
+            entry[0] += cups
+            entry[2] += 1
+            self.stats['increments'] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='water-write-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.flush_interval / 4):
+                try:
+                    self.flush(older_than=self.flush_interval)
+                except Exception as e:
+                    # The increments went back into the buffer; retry on the next tick
+                    print(f"⚠️ Water buffer flush failed: {e}")
+        finally:
+            # Let the next add() start a fresh thread if this one ever exits
+            with self._cond:
+                self._thread = None
+
+    def flush(self, user_id=None, older_than=0.0):
+        """Write pending increments (only user_id's if given) that are at least older_than seconds old"""
+        now = time.monotonic()
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            batch = {key: entry for key, entry in self._pending.items()
+                     if (user_id is None or key[0] == user_id) and now - entry[1] >= older_than}
+            if not batch:
+                return 0
+            for key in batch:
+                del self._pending[key]
+            self._flushing = True
+        written = False
+        try:
+            inserted = self._write(batch)
+            written = True
+        finally:
+            with self._cond:
+                if written:
+                    self.stats['flushes'] += 1
+                    self.stats['upserts'] += len(batch)
+                    self.stats['inserted_rows'] += inserted
+                else:
+                    # Keep the increments for the next attempt, ahead of anything added meanwhile
+                    self.stats['failed_flushes'] += 1
+                    for key, (cups, first_added, increments) in batch.items():
+                        entry = self._pending.setdefault(key, [0.0, first_added, 0])
+                        entry[0] += cups
+                        entry[1] = min(entry[1], first_added)
+                        entry[2] += increments
+                self._flushing = False
+                self._epoch += 1
+                self._cond.notify_all()
+        return len(batch)
+
+    def _write(self, batch):
+        inserted = 0
+        created_at = datetime.now().isoformat()
+        with transaction() as conn:
+            for (user_id, date), (cups, _, _) in batch.items():
+                updated = conn.execute('''UPDATE water_logs SET cups = cups + ?, created_at = ?
+                                          WHERE id = (SELECT MAX(id) FROM water_logs WHERE user_id=? AND date=?)''',
+                                       (cups, created_at, user_id, date)).rowcount
+                if not updated:
+                    conn.execute('INSERT INTO water_logs (user_id, date, cups, created_at) VALUES (?, ?, ?, ?)',
+                                 (user_id, date, cups, created_at))
+                    inserted += 1
+        for user_id, date in batch:
+            query_cache.invalidate(user_id, date, 'water_logs')
+        return inserted
+
+    def read(self, user_id, start, end, read_stored):
+        """(read_stored(), {date: pending cups}) for user_id's dates in [start, end], as of one instant"""
+        while True:
+            with self._cond:
+                while self._flushing:
+                    self._cond.wait()
+                epoch = self._epoch
+            stored = read_stored()
+            with self._cond:
+                # Retry if a flush moved increments into the database while we were reading it
+                if not self._flushing and self._epoch == epoch:
+                    return stored, {date: entry[0] for (uid, date), entry in self._pending.items()
+                                    if uid == user_id and start <= date <= end}
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def pending_increments(self):
+        with self._cond:
+            return sum(entry[2] for entry in self._pending.values())
+
+    def close(self):
+        """Stop the background thread and write everything still pending"""
+        self._stop.set()
+        self.flush()
+
+
+water_buffer = WriteBuffer()
+atexit.register(water_buffer.close)
+
+
+def _today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+def _date_str(value):
+    return value if isinstance(value, str) else value.strftime('%Y-%m-%d')
+
+def cached_query(tables, scope, overlay=None):
+    """Serve a get_* function from query_cache
+
+    scope receives the function's arguments after user_id and returns
+    (start, end, *extra): the inclusive date range the result depends on
+    plus anything else that distinguishes the result. overlay, if given, is
+    called as overlay(lookup, user_id, *args) and merges writes still held in
+    water_buffer into the (cached) result.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(user_id, *args, **kwargs):
+            if overlay is not None:
+                return overlay(lambda: lookup(user_id, *args, **kwargs), user_id, *args, **kwargs)
+            return lookup(user_id, *args, **kwargs)
+
+        def lookup(user_id, *args, **kwargs):
+            start, end, *extra = scope(*args, **kwargs)
+            key = (func.__name__, user_id, start, end, *extra)
+            hit, value = query_cache.get(key)
+            if hit:
+                return value
+            generation = query_cache.generation(user_id)
+            value = func(user_id, *args, **kwargs)
+            query_cache.put(key, user_id, tables, start, end, value, generation)
+            return value
+        return wrapper
+    return decorator
+
+def _day_scope(date=None):
+    date = _date_str(date) if date is not None else _today()
+    return date, date
+
+def _range_scope(start, end, granularity='day'):
+    return _date_str(start), _date_str(end), granularity
+
+def _history_scope(days=30):
+    return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d'), '9999-12-31'
+
+def _water_intake_overlay(lookup, user_id, date=None):
+    date = _day_scope(date)[0]
+    stored, pending = water_buffer.read(user_id, date, date, lookup)
+    return stored + pending.get(date, 0)
+
+def _range_totals_overlay(lookup, user_id, start, end, granularity='day'):
+    start, end = _range_scope(start, end)[:2]
+    totals, pending = water_buffer.read(user_id, start, end, lookup)
+    if pending:
+        buckets = {row['date']: row for row in totals}
+        bucket_of = RANGE_GRANULARITIES[granularity][1]
+        for date, cups in pending.items():
+            buckets[bucket_of(_as_date(date)).strftime('%Y-%m-%d')]['water'] += cups
+    return totals
+
+
+# Data Access Functions
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def authenticate_user(username, password):
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT id FROM users WHERE username=? AND password_hash=?',
+                  (username, hash_password(password)))
+        result = c.fetchone()
+    return result[0] if result else None
+
+def get_user_id(username):
+    with get_connection() as conn:
+        result = conn.execute('SELECT id FROM users WHERE username=?', (username,)).fetchone()
+    return result[0] if result else None
+
+def create_user(username, password):
+    try:
+        with transaction() as conn:
+            conn.execute('INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)',
+                         (username, hash_password(password), datetime.now().isoformat()))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+def save_meal_log(user_id, meal_data):
+    with transaction() as conn:
+        conn.execute('''INSERT INTO meal_logs (user_id, date, meal_type, food_name, calories, protein, carbs, fats, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (user_id, meal_data['date'], meal_data['meal_type'], meal_data['food_name'],
+                      meal_data['calories'], meal_data.get('protein', 0), meal_data.get('carbs', 0),
+                      meal_data.get('fats', 0), datetime.now().isoformat()))
+    query_cache.invalidate(user_id, _date_str(meal_data['date']), 'meal_logs')
+
+def save_water_log(user_id, cups, date=None):
+    if date is None:
+        date = datetime.now().strftime('%Y-%m-%d')
+    if water_buffer.enabled:
+        if cups:
+            water_buffer.add(user_id, _date_str(date), float(cups))
+        return
+    with transaction() as conn:
+        conn.execute('INSERT INTO water_logs (user_id, date, cups, created_at) VALUES (?, ?, ?, ?)',
+                     (user_id, date, cups, datetime.now().isoformat()))
+    query_cache.invalidate(user_id, _date_str(date), 'water_logs')
+
+def save_workout(user_id, workout_data):
+    with transaction() as conn:
+        conn.execute('''INSERT INTO workout_logs (user_id, date, exercise, duration, calories_burned, intensity, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                     (user_id, workout_data['date'], workout_data['exercise'], workout_data['duration'],
+                      workout_data['calories_burned'], workout_data['intensity'], datetime.now().isoformat()))
+    query_cache.invalidate(user_id, _date_str(workout_data['date']), 'workout_logs')
+
+def save_progress(user_id, progress_data):
+    with transaction() as conn:
+        conn.execute('''INSERT INTO progress_tracking (user_id, date, weight, waist, hip, chest, notes, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (user_id, progress_data['date'], progress_data.get('weight'), progress_data.get('waist'),
+                      progress_data.get('hip'), progress_data.get('chest'), progress_data.get('notes', ''),
+                      datetime.now().isoformat()))
+    query_cache.invalidate(user_id, _date_str(progress_data['date']), 'progress_tracking')
+
+# Bulk Ingestion
+def _parse_date(value):
+    return datetime.strptime(str(value).strip()[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+
+def _non_negative(parse):
+    def parser(value):
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(f"{value} is not a finite number")
+        if number < 0:
+            raise ValueError(f"{value} is negative")
+        if parse is int and not number.is_integer():
+            raise ValueError(f"{value} is not a whole number")
+        return parse(number)
+    return parser
+
+_REQUIRED = object()
+
+# Per table: (column, parser, default); _REQUIRED columns must be present and non-empty
+BULK_TABLES = {
+    'meal_logs': [('date', _parse_date, _REQUIRED), ('meal_type', str, 'imported'),
+                  ('food_name', str, _REQUIRED), ('calories', _non_negative(int), _REQUIRED),
+                  ('protein', _non_negative(float), 0), ('carbs', _non_negative(float), 0),
+                  ('fats', _non_negative(float), 0)],
+    'water_logs': [('date', _parse_date, _REQUIRED), ('cups', _non_negative(float), _REQUIRED)],
+    'workout_logs': [('date', _parse_date, _REQUIRED), ('exercise', str, _REQUIRED),
+                     ('duration', _non_negative(int), _REQUIRED), ('calories_burned', _non_negative(int), _REQUIRED),
+                     ('intensity', str, 'moderate')],
+    'progress_tracking': [('date', _parse_date, _REQUIRED), ('weight', _non_negative(float), None),
+                          ('waist', _non_negative(float), None), ('hip', _non_negative(float), None),
+                          ('chest', _non_negative(float), None), ('notes', str, '')],
+}
+BULK_CHUNK_SIZE = 5000
+
+def validate_bulk_row(table, row):
+    """Return the row's values in BULK_TABLES column order, raising ValueError if invalid"""
+    if not isinstance(row, dict):
+        raise ValueError(f"expected an object, got {type(row).__name__}")
+    values = []
+    for column, parse, default in BULK_TABLES[table]:
+        raw = row.get(column)
+        if raw is None or (isinstance(raw, str) and not raw.strip()):
+            if default is _REQUIRED:
+                raise ValueError(f"missing {column}")
+            values.append(default)
+            continue
+        try:
+            values.append(parse(raw))
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"bad {column}: {e}")
+    return values
+
+def bulk_save(user_id, table, rows, chunk_size=BULK_CHUNK_SIZE, on_reject=None, atomic=True):
+    """Validate and insert an iterable of row dicts with executemany
+
+    Rows are consumed lazily and written chunk_size at a time, so any
+    iterable (e.g. a streaming file reader) works without being loaded into
+    memory. With atomic=True the whole load is one transaction; otherwise
+    each chunk commits on its own. Invalid rows are passed to
+    on_reject(row, reason), or raise ValueError when no callback is given.
+    Returns {'inserted': n, 'rejected': n}.
+    """
+    columns = [column for column, _, _ in BULK_TABLES[table]]
+    sql = (f"INSERT INTO {table} (user_id, {', '.join(columns)}, created_at) "
+           f"VALUES ({', '.join('?' * (len(columns) + 2))})")
+    inserted = rejected = 0
+
+    def chunks():
+        nonlocal rejected
+        chunk = []
+        for row in rows:
+            try:
+                values = validate_bulk_row(table, row)
+            except ValueError as e:
+                if on_reject is None:
+                    raise
+                on_reject(row, str(e))
+                rejected += 1
+                continue
+            chunk.append((user_id, *values, row.get('created_at') or datetime.now().isoformat()))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    try:
+        if atomic:
+            with transaction() as conn:
+                for chunk in chunks():
+                    conn.executemany(sql, chunk)
+                    inserted += len(chunk)
+        else:
+            for chunk in chunks():
+                with transaction() as conn:
+                    conn.executemany(sql, chunk)
+                inserted += len(chunk)
+    finally:
+        if inserted:
+            query_cache.invalidate(user_id, None, table)
+    return {'inserted': inserted, 'rejected': rejected}
+
+def save_meal_logs(user_id, meals):
+    """Insert several meal_data dicts in one transaction"""
+    return bulk_save(user_id, 'meal_logs', meals)['inserted']
+
+def save_water_logs(user_id, entries):
+    return bulk_save(user_id, 'water_logs', entries)['inserted']
+
+def save_workouts(user_id, workouts):
+    return bulk_save(user_id, 'workout_logs', workouts)['inserted']
+
+def save_progress_entries(user_id, entries):
+    return bulk_save(user_id, 'progress_tracking', entries)['inserted']
+
+@cached_query(('meal_logs',), _day_scope)
+def get_meal_logs(user_id, date=None):
+    if date is None:
+        date = datetime.now().strftime('%Y-%m-%d')
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT * FROM meal_logs WHERE user_id=? AND date=? ORDER BY created_at DESC', (user_id, date))
+        meals = c.fetchall()
+    return meals
+
+@cached_query(('meal_logs',), _day_scope)
+def get_daily_totals(user_id, date=None):
+    if date is None:
+        date = datetime.now().strftime('%Y-%m-%d')
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT calories, protein, carbs, fats FROM daily_summary WHERE user_id=? AND date=?',
+                  (user_id, date))
+        result = c.fetchone() or (0, 0, 0, 0)
+    return {
+        'calories': int(result[0]) if result[0] else 0,
+        'protein': float(result[1]) if result[1] else 0,
+        'carbs': float(result[2]) if result[2] else 0,
+        'fats': float(result[3]) if result[3] else 0
+    }
+
+@cached_query(('water_logs',), _day_scope, _water_intake_overlay)
+def get_water_intake(user_id, date=None):
+    if date is None:
+        date = datetime.now().strftime('%Y-%m-%d')
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT water FROM daily_summary WHERE user_id=? AND date=?', (user_id, date))
+        result = c.fetchone()
+    return result[0] if result else 0
+
+# SQL expression and Python equivalent mapping a 'YYYY-MM-DD' date to its bucket
+RANGE_GRANULARITIES = {
+    'day': ("date", lambda d: d),
+    'week': ("date(date, '-6 days', 'weekday 1')", lambda d: d - timedelta(days=d.weekday())),
+    'month': ("strftime('%Y-%m-01', date)", lambda d: d.replace(day=1)),
+}
+
+def _as_date(value):
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+@cached_query(('meal_logs', 'water_logs', 'workout_logs'), _range_scope, _range_totals_overlay)
+def get_range_totals(user_id, start, end, granularity='day'):
+    """Per-bucket intake, water and workout totals between start and end (inclusive)
+
+    Runs one grouped range query over daily_summary and zero-fills buckets
+    with no rows. Buckets are keyed by their first day:
+    the day itself, the Monday of the week, or the first of the month.
+    """
+    if granularity not in RANGE_GRANULARITIES:
+        raise ValueError(f"granularity must be one of {sorted(RANGE_GRANULARITIES)}")
+    bucket_sql, bucket_of = RANGE_GRANULARITIES[granularity]
+    start, end = _as_date(start), _as_date(end)
+    start_str, end_str = start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+    sql = f'''SELECT {bucket_sql} AS bucket, SUM(calories), SUM(protein), SUM(carbs), SUM(fats),
+                     SUM(water), SUM(calories_burned)
+              FROM daily_summary WHERE user_id=? AND date BETWEEN ? AND ?
+              GROUP BY bucket'''
+    params = (user_id, start_str, end_str)
+    with get_connection() as conn:
+        rows = {row[0]: row[1:] for row in conn.execute(sql, params)}
+
+    totals = []
+    seen = set()
+    day = start
+    while day <= end:
+        bucket = bucket_of(day).strftime('%Y-%m-%d')
+        if bucket not in seen:
+            seen.add(bucket)
+            cal, protein, carbs, fats, water, burned = rows.get(bucket, (0, 0, 0, 0, 0, 0))
+            totals.append({
+                'date': bucket,
+                'calories': int(cal or 0),
+                'protein': float(protein or 0),
+                'carbs': float(carbs or 0),
+                'fats': float(fats or 0),
+                'water': float(water or 0),
+                'calories_burned': int(burned or 0)
+            })
+        day += timedelta(days=1)
+    return totals
+
+@cached_query(('progress_tracking',), _history_scope)
+def get_progress_history(user_id, days=30):
+    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT date, weight FROM progress_tracking WHERE user_id=? AND date>=? ORDER BY date',
+                  (user_id, start_date))
+        data = c.fetchall()
+    return data
+
+@cached_query(('workout_logs',), _history_scope)
+def get_workout_history(user_id, days=30):
+    start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+    with get_connection() as conn:
+        c = conn.cursor()
+        c.execute('SELECT date, exercise, duration, calories_burned FROM workout_logs WHERE user_id=? AND date>=? ORDER BY date',
+                  (user_id, start_date))
+        data = c.fetchall()
+    return data
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage the nutrition app database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    migrate_cmd = sub.add_parser('migrate', help='apply pending schema migrations')
+    migrate_cmd.add_argument('--target', type=int, default=None)
+    sub.add_parser('check-plans', help='fail if a hot query plans a full table scan')
+    rollup_cmd = sub.add_parser('rollup', help='verify or rebuild the daily_summary rollup')
+    rollup_cmd.add_argument('--rebuild', action='store_true', help='recompute rollups from the raw logs')
+    args = parser.parse_args()
+
+    with get_connection() as conn:
+        if args.command == 'migrate':
+            applied = migrate(conn, args.target)
+            print(f"Applied migrations: {applied or 'none'}; schema version {get_schema_version(conn)}")
+        elif args.command == 'check-plans':
+            migrate(conn)
+            failures = check_query_plans(conn)
+            for name, detail in failures:
+                print(f"FULL SCAN in {name}: {detail}")
+            if failures:
+                raise SystemExit(1)
+            print(f"All {len(QUERY_PLAN_CHECKS)} query plans use an index")
+        elif args.command == 'rollup':
+            migrate(conn)
+            drift = verify_daily_summary(conn)
+            for source, row in drift:
+                print(f"DRIFT {source:>6}: {row}")
+            print(f"{len(drift)} drifted rollup rows")
+            if args.rebuild:
+                with conn:
+                    rebuild_daily_summary(conn)
+                print(f"Rebuilt daily_summary; {len(verify_daily_summary(conn))} drifted rows remain")
+            elif drift:
+                raise SystemExit(1)
@@ -0,0 +1,199 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from catalog import load_compiled
+
+NUMERIC_FEATURES = {
+    'age': 'Age',
+    'bmi': 'BMI',
+    'cholesterol': 'Cholesterol_mg/dL',
+    'blood_pressure': 'Blood_Pressure_mmHg',
+    'glucose': 'Glucose_mg/dL',
+    'exercise_hours': 'Weekly_Exercise_Hours',
+}
+CATEGORICAL_FEATURES = {
+    'gender': 'Gender',
+    'disease_type': 'Disease_Type',
+    'severity': 'Severity',
+    'activity_level': 'Physical_Activity_Level',
+    'dietary_restrictions': 'Dietary_Restrictions',
+}
+LABEL_COLUMN = 'Diet_Recommendation'
+# Extra pull for features that drive the recommendation; everything else weighs 1
+FEATURE_WEIGHTS = {'disease_type': 3.0, 'severity': 1.5}
+# The sidebar offers finer activity levels than the dataset records
+CATEGORY_ALIASES = {'light': 'sedentary', 'very_active': 'active'}
+DEFAULT_K = 7
+
+
+def _category(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return 'none'
+    value = str(value).strip().lower()
+    return CATEGORY_ALIASES.get(value, value)
+
+
+class DietRecommender:
+    """k-nearest-neighbour diet recommender over standardized, one-hot encoded patient profiles
+
+    Training rows are encoded once into a small float32 matrix; a query
+    encodes one profile and scans that matrix with a single vectorized
+    distance computation. Profile fields that are missing or unseen in the
+    training data are left neutral rather than guessed.
+    """
+
+    def __init__(self, features, labels, classes, means, stds, categories, k=DEFAULT_K):
+        self.features = features
+        self.labels = labels
+        self.classes = classes
+        self.means = means
+        self.stds = stds
+        self.categories = categories
+        self.k = k
+        self.columns = {}
+        offset = len(NUMERIC_FEATURES)
+        for name in CATEGORICAL_FEATURES:
+            self.columns[name] = {value: offset + i for i, value in enumerate(categories[name])}
+            offset += len(categories[name])
+        self.width = offset
+        self.weights = np.array([FEATURE_WEIGHTS.get(name, 1.0) for name in NUMERIC_FEATURES], dtype=np.float32)
+
+    @classmethod
+    def fit(cls, df, k=DEFAULT_K):
+        numeric = df[list(NUMERIC_FEATURES.values())].to_numpy(dtype=np.float64)
+        means = np.nanmean(numeric, axis=0)
+        stds = np.nanstd(numeric, axis=0)
+        stds[stds == 0] = 1.0
+        categories = {name: sorted({_category(v) for v in df[column]})
+                      for name, column in CATEGORICAL_FEATURES.items()}
+        classes, labels = np.unique(df[LABEL_COLUMN].astype(str).to_numpy(), return_inverse=True)
+        model = cls(None, labels.astype(np.int32), classes.tolist(), means, stds, categories, k)
+        model.features = model.encode_frame(df)
+        return model
+
+    def encode_frame(self, df):
+        """Encode a DataFrame with the dataset's column names into the model's feature space"""
+        encoded = np.zeros((len(df), self.width), dtype=np.float32)
+        numeric = df[list(NUMERIC_FEATURES.values())].to_numpy(dtype=np.float64)
+        scaled = (numeric - self.means) / self.stds
+        encoded[:, :len(NUMERIC_FEATURES)] = np.nan_to_num(scaled) * self.weights
+        for name, column in CATEGORICAL_FEATURES.items():
+            positions = df[column].map(lambda v: self.columns[name].get(_category(v), -1)).to_numpy()
+            rows = np.flatnonzero(positions >= 0)
+            encoded[rows, positions[rows]] = FEATURE_WEIGHTS.get(name, 1.0)
+        return encoded
+
+    def encode(self, profile):
+        """Encode one profile dict keyed like NUMERIC_FEATURES/CATEGORICAL_FEATURES"""
+        vector = np.zeros(self.width, dtype=np.float32)
+        for i, name in enumerate(NUMERIC_FEATURES):
+            value = profile.get(name)
+            if value is not None:
+                vector[i] = (float(value) - self.means[i]) / self.stds[i] * self.weights[i]
+        for name in CATEGORICAL_FEATURES:
+            if name in profile:
+                position = self.columns[name].get(_category(profile[name]))
+                if position is not None:
+                    vector[position] = FEATURE_WEIGHTS.get(name, 1.0)
+        return vector
+
+    def _vote(self, distances, k):
+        nearest = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        votes = np.bincount(self.labels[nearest], weights=1.0 / (1.0 + np.sqrt(distances[nearest])),
+                            minlength=len(self.classes))
+        return votes / votes.sum()
+
+    def recommend(self, profile, k=None):
+        """Return {'diet', 'confidence', 'votes'} for one profile"""
+        query = self.encode(profile)
+        distances = ((self.features - query) ** 2).sum(axis=1)
+        shares = self._vote(distances, k or self.k)
+        best = int(np.argmax(shares))
+        return {
+            'diet': self.classes[best],
+            'confidence': float(shares[best]),
+            'votes': {label: float(share) for label, share in zip(self.classes, shares)}
+        }
+
+    def predict(self, encoded, k=None):
+        """Label codes for an encoded matrix, one row per profile"""
+        k = min(k or self.k, len(self.features))
+        # |a - b|^2 = |a|^2 - 2ab + |b|^2, computed for every pair at once
+        distances = ((encoded ** 2).sum(axis=1)[:, None] - 2 * encoded @ self.features.T
+                     + (self.features ** 2).sum(axis=1)[None, :])
+        distances = np.maximum(distances, 0)
+        return np.array([int(np.argmax(self._vote(row, k))) for row in distances], dtype=np.int32)
+
+
+def train_diet_recommender(path, k=DEFAULT_K):
+    return DietRecommender.fit(pd.read_csv(path), k)
+
+
+def load_diet_recommender(path='diet_recommendations_dataset.csv'):
+    """Trained recommender for the dataset, compiled to disk and rebuilt only when the CSV changes"""
+    try:
+        return load_compiled(path, 'diet-knn', train_diet_recommender)
+    except FileNotFoundError:
+        return None
+
+
+def evaluate(df, k=DEFAULT_K, folds=5, seed=0):
+    """Shuffled k-fold cross-validated accuracy of a DietRecommender on df"""
+    order = np.random.default_rng(seed).permutation(len(df))
+    correct = 0
+    for fold in np.array_split(order, folds):
+        test = np.zeros(len(df), dtype=bool)
+        test[fold] = True
+        model = DietRecommender.fit(df[~test], k)
+        predicted = model.predict(model.encode_frame(df[test]))
+        expected = df[LABEL_COLUMN].astype(str).to_numpy()[test]
+        correct += int((np.array(model.classes)[predicted] == expected).sum())
+    return correct / len(df)
+
+
+def main():
+    import pickle
+    # Use the importable module so compiled pickles reference diet_recommender.*, not __main__.*
+    import diet_recommender
+
+    parser = argparse.ArgumentParser(description='Evaluate the k-NN diet recommender offline')
+    parser.add_argument('path', nargs='?', default='diet_recommendations_dataset.csv')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path)
+    majority = df[LABEL_COLUMN].value_counts(normalize=True).iloc[0]
+    print(f"{len(df)} patients, majority-class baseline {majority:.1%}")
+    for k in (1, 3, 5, 7, 11, 15):
+        print(f"k={k:<3} {args.folds}-fold accuracy {diet_recommender.evaluate(df, k, args.folds):.1%}")
+    # Without a diagnosis the sidebar profile alone has little to go on
+    no_disease = df.assign(Disease_Type=None, Severity=None)
+    accuracy = diet_recommender.evaluate(no_disease, DEFAULT_K, args.folds)
+    print(f"k={DEFAULT_K:<3} accuracy without Disease_Type/Severity {accuracy:.1%}")
+
+    started = time.perf_counter()
+    model = diet_recommender.DietRecommender.fit(df)
+    print(f"train {(time.perf_counter() - started) * 1000:.1f} ms, "
+          f"artifact {len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) / 1024:.1f} KB")
+    started = time.perf_counter()
+    diet_recommender.load_diet_recommender(args.path)
+    print(f"load (compiled cache) {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    records = df.sample(args.queries, replace=True, random_state=0)
+    profiles = [{name: row[column] for name, column in {**NUMERIC_FEATURES, **CATEGORICAL_FEATURES}.items()}
+                for _, row in records.iterrows()]
+    latencies = []
+    for profile in profiles:
+        started = time.perf_counter()
+        model.recommend(profile)
+        latencies.append((time.perf_counter() - started) * 1e6)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"recommend() latency over {len(profiles)} queries: p50 {p50:.0f} µs, p95 {p95:.0f} µs, p99 {p99:.0f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,521 @@
+import os
+import re
+import time
+import random
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from database import ConnectionPool
+from instrumentation import span
+
+MODEL_NAME = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+CACHE_PATH = os.getenv('GEMINI_CACHE_PATH', 'gemini_cache.db')
+CACHE_TTL = float(os.getenv('GEMINI_CACHE_TTL', str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv('GEMINI_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+
+# Gateway limits; set GEMINI_BACKEND=stub to run offline against StubModel
+BACKEND = os.getenv('GEMINI_BACKEND', 'genai')
+REQUESTS_PER_MINUTE = int(os.getenv('GEMINI_RPM', '60'))
+TOKENS_PER_MINUTE = int(os.getenv('GEMINI_TPM', '250000'))
+MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '4'))
+RETRY_BASE_DELAY = float(os.getenv('GEMINI_RETRY_BASE_DELAY', '1.0'))
+RETRY_MAX_DELAY = float(os.getenv('GEMINI_RETRY_MAX_DELAY', '30.0'))
+
+
+# Response Cache
+class ResponseCache:
+    """On-disk, content-addressed cache of Gemini responses
+
+    Entries are keyed by a hash of the model name, the whitespace-normalized
+    prompt and any image bytes. Expired entries are dropped on read and the
+    least recently used entries are evicted once the total size exceeds
+    max_bytes. Backed by SQLite so every process on the host shares it.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._pool = ConnectionPool(path, size=4)
+        self.hits = 0
+        self.misses = 0
+        with self._pool.transaction() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS responses
+                            (key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER,
+                             created_at REAL, accessed_at REAL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)')
+
+    @staticmethod
+    def make_key(model, prompt, image_data=None):
+        h = hashlib.sha256()
+        h.update(model.encode())
+        h.update(b'\0')
+        h.update(re.sub(r'\s+', ' ', prompt).strip().encode())
+        for part in image_data or []:
+            h.update(b'\0')
+            h.update(part.get('mime_type', '').encode())
+            h.update(hashlib.sha256(part['data']).digest())
+        return h.hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._pool.transaction() as conn:
+            row = conn.execute('SELECT response, created_at FROM responses WHERE key=?', (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                if row is not None:
+                    conn.execute('DELETE FROM responses WHERE key=?', (key,))
+                self.misses += 1
+                return None
+            conn.execute('UPDATE responses SET accessed_at=? WHERE key=?', (now, key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        size = len(response.encode())
+        with self._pool.transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                         (key, model, response, size, now, now))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed_at'):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM responses WHERE key=?', doomed)
+
+    def clear(self):
+        with self._pool.transaction() as conn:
+            conn.execute('DELETE FROM responses')
+
+    def stats(self):
+        with self._pool.connection() as conn:
+            entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return {'entries': entries, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide response cache, creating it on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+# Gateway
+_api_key = None
+
+
+def configure(api_key):
+    """Set the API key used when the Gemini SDK is first needed"""
+    global _api_key
+    _api_key = api_key
+
+
+def genai_model(model_name):
+    # google.generativeai takes about a second to import, so it is only loaded
+    # (and configured) when the first real model is created
+    import google.generativeai as genai
+    if _api_key:
+        genai.configure(api_key=_api_key)
+    return genai.GenerativeModel(model_name)
+
+
+class TokenBucket:
+    """Refills capacity units evenly over each minute; acquire blocks until enough are available"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """Charge (or refund, if negative) the difference between an estimate and actual use"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class StubBackendError(Exception):
+    code = 429
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Offline stand-in for genai.GenerativeModel with configurable latency and failures"""
+
+    def __init__(self, model_name, latency=None, error_rate=None):
+        self.model_name = model_name
+        self.latency = float(os.getenv('GEMINI_STUB_LATENCY', '0.2')) if latency is None else latency
+        self.error_rate = float(os.getenv('GEMINI_STUB_ERROR_RATE', '0')) if error_rate is None else error_rate
+
+    def generate_content(self, content, stream=False):
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise StubBackendError('429 stub quota exceeded')
+        text = f"[{self.model_name} stub] Response to: {str(content[0]).strip()[:200]}"
+        if stream:
+            return (StubResponse(word + ' ') for word in text.split(' '))
+        return StubResponse(text)
+
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'InternalServerError',
+                    'DeadlineExceeded', 'GatewayTimeout', 'BadGateway'}
+
+
+def _is_retryable(error):
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    return getattr(error, 'code', None) in RETRYABLE_STATUS
+
+
+def estimate_tokens(content):
+    """Rough token count used to charge the per-minute token budget before a call"""
+    tokens = 0
+    for part in content:
+        if isinstance(part, str):
+            tokens += len(part) // 4 + 1
+        else:
+            tokens += 258  # Gemini bills each image at a flat rate
+    return tokens
+
+
+class GeminiGateway:
+    """Process-wide entry point for model calls
+
+    Reuses one model instance per model name, enforces requests- and
+    tokens-per-minute budgets, caps in-flight calls and retries transient
+    failures (429/5xx) with full-jitter exponential backoff.
+    """
+
+    def __init__(self, model_factory=None, rpm=REQUESTS_PER_MINUTE, tpm=TOKENS_PER_MINUTE,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        if model_factory is None:
+            model_factory = StubModel if BACKEND == 'stub' else genai_model
+        self.model_factory = model_factory
+        self.namespace = 'stub' if model_factory is StubModel else 'genai'
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._models = {}
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._latencies = deque(maxlen=1000)
+        self._counts = {'calls': 0, 'retries': 0, 'errors': 0}
+        self._throttled = 0.0
+
+    def get_model(self, model_name=MODEL_NAME):
+        with self._lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._models[model_name] = self.model_factory(model_name)
+            return model
+
+    def _enter(self, content):
+        with self._lock:
+            self._waiting += 1
+        try:
+            throttled = self.requests.acquire(1) + self.tokens.acquire(estimate_tokens(content))
+            self._slots.acquire()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._in_flight += 1
+            self._throttled += throttled
+
+    def _exit(self, started, ok):
+        self._slots.release()
+        with self._lock:
+            self._in_flight -= 1
+            self._counts['calls'] += 1
+            if ok:
+                self._latencies.append(time.monotonic() - started)
+            else:
+                self._counts['errors'] += 1
+
+    def _backoff(self, attempt):
+        with self._lock:
+            self._counts['retries'] += 1
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def _charge_actual(self, response, content):
+        usage = getattr(response, 'usage_metadata', None)
+        total = getattr(usage, 'total_token_count', None)
+        if total:
+            self.tokens.adjust(total - estimate_tokens(content))
+
+    def generate(self, content, model_name=MODEL_NAME):
+        """Return the response text for content, retrying transient failures"""
+        model = self.get_model(model_name)
+        attempt = 0
+        while True:
+            self._enter(content)
+            started = time.monotonic()
+            ok = False
+            try:
+                response = model.generate_content(content)
+                text = response.text
+                ok = True
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+            finally:
+                self._exit(started, ok)
+            if ok:
+                self._charge_actual(response, content)
+                return text
+            self._backoff(attempt)
+            attempt += 1
+
+    def stream(self, content, model_name=MODEL_NAME):
+        """Yield response text chunks; failures before the first chunk are retried"""
+        model = self.get_model(model_name)
+        attempt = 0
+        while True:
+            self._enter(content)
+            started = time.monotonic()
+            yielded = False
+            ok = False
+            try:
+                for chunk in model.generate_content(content, stream=True):
+                    if chunk.text:
+                        yielded = True
+                        yield chunk.text
+                ok = True
+                return
+            except Exception as e:
+                if yielded or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+            finally:
+                self._exit(started, ok)
+            self._backoff(attempt)
+            attempt += 1
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = dict(self._counts)
+            metrics = {
+                'queue_depth': self._waiting,
+                'in_flight': self._in_flight,
+                'throttled_seconds': round(self._throttled, 3),
+                **counts
+            }
+        for pct in (50, 95, 99):
+            metrics[f'latency_p{pct}'] = latencies[min(len(latencies) - 1, len(latencies) * pct // 100)] if latencies else None
+        return metrics
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide Gemini gateway, creating it on first use"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = GeminiGateway()
+    return _gateway
+
+
+# In-flight Deduplication
+# Concurrent identical requests (e.g. several sessions clicking the same
+# article) wait on the first caller's result instead of calling upstream.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class StreamAbandoned(Exception):
+    """Raised to single-flight followers when the leading stream is closed before it finishes"""
+
+
+def _join_flight(key):
+    """(future, leader) for key; the leader must resolve the future and then call _leave_flight"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+    return future, leader
+
+
+def _leave_flight(key):
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+
+def _single_flight(key, func):
+    future, leader = _join_flight(key)
+    if not leader:
+        return future.result()
+    try:
+        result = func()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _leave_flight(key)
+
+
+def generate_response(input_prompt, image_data=None, use_cache=True):
+    """Return the model's response text, raising on upstream errors"""
+    with span('gemini', 'generate', bytes_in=_payload_bytes(input_prompt, image_data)) as event:
+        text = _generate_response(input_prompt, image_data, use_cache, event)
+        event['bytes_out'] = len(text)
+        return text
+
+
+def _payload_bytes(input_prompt, image_data):
+    return len(input_prompt) + sum(len(part['data']) for part in image_data or [])
+
+
+def _generate_response(input_prompt, image_data, use_cache, event):
+    gateway = get_gateway()
+    cache = get_response_cache() if use_cache else None
+    key = ResponseCache.make_key(f"{gateway.namespace}/{MODEL_NAME}", input_prompt, image_data)
+    event['cached'] = False
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            event['cached'] = True
+            return cached
+
+    def generate():
+        content = [input_prompt]
+        if image_data:
+            content.extend(image_data)
+        text = gateway.generate(content)
+        if cache is not None:
+            cache.put(key, MODEL_NAME, text)
+        return text
+
+    return _single_flight(key, generate)
+
+
+def get_gemini_response(input_prompt, image_data=None, use_cache=True):
+    try:
+        return generate_response(input_prompt, image_data, use_cache)
+    except Exception as e:
+        return f"❌ Error: {str(e)}"
+
+
+def stream_gemini_response(input_prompt, image_data=None, use_cache=True):
+    """Yield the response text chunk by chunk as the model generates it
+
+    A cached response is yielded in one piece. The full text is cached only
+    when the stream completes; if it breaks off, the chunks received so far
+    are followed by a warning chunk and nothing is cached. Concurrent
+    identical requests share one upstream call: followers wait for the
+    leader's full text and yield it in one piece.
+    """
+    with span('gemini', 'stream', bytes_in=_payload_bytes(input_prompt, image_data)) as event:
+        event['bytes_out'] = 0
+        for text in _stream_response(input_prompt, image_data, use_cache, event):
+            event['bytes_out'] += len(text)
+            yield text
+
+
+def _stream_response(input_prompt, image_data, use_cache, event):
+    gateway = get_gateway()
+    cache = get_response_cache() if use_cache else None
+    key = ResponseCache.make_key(f"{gateway.namespace}/{MODEL_NAME}", input_prompt, image_data)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            event['cached'] = True
+            yield cached
+            return
+    event['cached'] = False
+
+    while True:
+        future, leader = _join_flight(key)
+        if leader:
+            break
+        event['shared'] = True
+        try:
+            text = future.result()
+        except StreamAbandoned:
+            # The leader's reader went away; take over the call
+            continue
+        except Exception as e:
+            yield f"❌ Error: {str(e)}"
+            return
+        yield text
+        return
+
+    content = [input_prompt]
+    if image_data:
+        content.extend(image_data)
+    chunks = []
+    try:
+        for text in gateway.stream(content):
+            chunks.append(text)
+            yield text
+        text = ''.join(chunks)
+        if cache is not None and chunks:
+            cache.put(key, MODEL_NAME, text)
+        future.set_result(text)
+    except Exception as e:
+        future.set_exception(e)
+        if chunks:
+            yield f"\n\n⚠️ Response interrupted: {str(e)}"
+        else:
+            yield f"❌ Error: {str(e)}"
+    finally:
+        # A stream closed by its consumer half-way must not leave followers waiting
+        if not future.done():
+            future.set_exception(StreamAbandoned())
+        _leave_flight(key)
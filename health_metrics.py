@@ -0,0 +1,214 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'very_active': 1.9
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.55
+BMI_BINS = [18.5, 25, 30]
+BMI_CATEGORIES = [("Underweight", "🟡"), ("Normal", "🟢"), ("Overweight", "🟠"), ("Obese", "🔴")]
+
+
+# Scalar Metrics
+def calculate_bmi(weight_kg, height_m):
+    return round(weight_kg / (height_m ** 2), 1)
+
+def get_bmi_category(bmi):
+    if bmi < 18.5:
+        return "Underweight", "🟡"
+    elif 18.5 <= bmi < 25:
+        return "Normal", "🟢"
+    elif 25 <= bmi < 30:
+        return "Overweight", "🟠"
+    else:
+        return "Obese", "🔴"
+
+def calculate_tdee(weight_kg, height_cm, age, gender, activity_level):
+    if gender.lower() == 'male':
+        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + 5
+    else:
+        bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
+    
+    tdee = bmr * ACTIVITY_MULTIPLIERS.get(activity_level, DEFAULT_ACTIVITY_MULTIPLIER)
+    return round(tdee), round(bmr)
+
+def get_macro_breakdown(calories, protein_percent=30, carb_percent=50, fat_percent=20):
+    return {
+        'protein_g': round((calories * protein_percent / 100) / 4, 1),
+        'carbs_g': round((calories * carb_percent / 100) / 4, 1),
+        'fat_g': round((calories * fat_percent / 100) / 9, 1)
+    }
+
+def calculate_whr(waist_cm, hip_cm):
+    return round(waist_cm / hip_cm, 2)
+
+def calculate_body_fat_estimate(bmi, age, gender):
+    if gender.lower() == 'male':
+        body_fat = (1.20 * bmi) + (0.23 * age) - 16.2
+    else:
+        body_fat = (1.20 * bmi) + (0.23 * age) - 5.4
+    return round(max(0, body_fat), 1)
+
+def get_calorie_deficit(tdee, weight_loss_goal_weeks):
+    weekly_deficit = 7000 / weight_loss_goal_weeks
+    daily_deficit = weekly_deficit / 7
+    return round(tdee - daily_deficit)
+
+
+# Batch Metrics
+# Array-in/array-out twins of the functions above for whole cohorts. Inputs
+# may be scalars, lists, NumPy arrays or DataFrame columns; results match the
+# scalar versions element for element, including Python's rounding.
+def _split(a):
+    c = 134217729.0 * a
+    hi = c - (c - a)
+    return hi, a - hi
+
+
+def _round(x, ndigits):
+    # np.round scales by 10**ndigits in floating point and so disagrees with round()
+    # on about 4% of 1-decimal inputs; recover the exact product error (Dekker)
+    # and use it to settle values that land exactly on a .5 after scaling
+    x = np.asarray(x, dtype=float)
+    scale = 10.0 ** ndigits
+    p = x * scale
+    x_hi, x_lo = _split(x)
+    s_hi, s_lo = _split(np.float64(scale))
+    err = ((x_hi * s_hi - p) + x_hi * s_lo + x_lo * s_hi) + x_lo * s_lo
+    tie = np.abs(p - np.trunc(p)) == 0.5
+    n = np.where(tie & (err > 0), np.ceil(p), np.where(tie & (err < 0), np.floor(p), np.rint(p)))
+    return n / scale
+
+
+def _by_category(values, lookup):
+    # Evaluate lookup once per distinct value and broadcast back via the codes
+    shape = np.shape(values)
+    if not isinstance(values, pd.Series):
+        values = pd.Series(np.ravel(np.asarray(values, dtype=object)))
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return np.array([lookup(u) for u in uniques])[codes].reshape(shape)
+
+
+def _is_male(gender):
+    return _by_category(gender, lambda g: g.lower() == 'male')
+
+
+def calculate_bmi_batch(weight_kg, height_m):
+    return _round(np.asarray(weight_kg, dtype=float) / np.asarray(height_m, dtype=float) ** 2, 1)
+
+
+def get_bmi_category_batch(bmi):
+    """(categories, emojis) arrays for an array of BMIs"""
+    index = np.digitize(np.asarray(bmi, dtype=float), BMI_BINS)
+    categories, emojis = (np.array(column) for column in zip(*BMI_CATEGORIES))
+    return categories[index], emojis[index]
+
+
+def calculate_tdee_batch(weight_kg, height_cm, age, gender, activity_level):
+    """(tdee, bmr) integer arrays"""
+    bmr = (10 * np.asarray(weight_kg, dtype=float) + 6.25 * np.asarray(height_cm, dtype=float)
+           - 5 * np.asarray(age, dtype=float) + np.where(_is_male(gender), 5, -161))
+    multiplier = _by_category(activity_level, lambda a: ACTIVITY_MULTIPLIERS.get(a, DEFAULT_ACTIVITY_MULTIPLIER))
+    return np.rint(bmr * multiplier).astype(np.int64), np.rint(bmr).astype(np.int64)
+
+
+def calculate_whr_batch(waist_cm, hip_cm):
+    return _round(np.asarray(waist_cm, dtype=float) / np.asarray(hip_cm, dtype=float), 2)
+
+
+def calculate_body_fat_estimate_batch(bmi, age, gender):
+    body_fat = (1.20 * np.asarray(bmi, dtype=float) + 0.23 * np.asarray(age, dtype=float)
+                + np.where(_is_male(gender), -16.2, -5.4))
+    # fmax, like max(0, x), turns NaN into 0
+    return _round(np.fmax(0, body_fat), 1)
+
+
+def get_calorie_deficit_batch(tdee, weight_loss_goal_weeks):
+    daily_deficit = 7000 / np.asarray(weight_loss_goal_weeks, dtype=float) / 7
+    return np.rint(np.asarray(tdee, dtype=float) - daily_deficit).astype(np.int64)
+
+
+def cohort_metrics(df):
+    """BMI, BMR, TDEE and body fat for every row of diet_recommendations_dataset.csv"""
+    bmi = calculate_bmi_batch(df['Weight_kg'], df['Height_cm'] / 100)
+    category, _ = get_bmi_category_batch(bmi)
+    tdee, bmr = calculate_tdee_batch(df['Weight_kg'], df['Height_cm'], df['Age'], df['Gender'],
+                                     df['Physical_Activity_Level'].str.lower())
+    return pd.DataFrame({
+        'BMI': bmi,
+        'BMI_Category': category,
+        'BMR': bmr,
+        'TDEE': tdee,
+        'Body_Fat_Estimate': calculate_body_fat_estimate_batch(bmi, df['Age'], df['Gender'])
+    }, index=df.index)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check and benchmark the batch health metrics against the scalar ones')
+    parser.add_argument('path', nargs='?', default='diet_recommendations_dataset.csv')
+    parser.add_argument('--scale', type=int, default=100, help='repeat the cohort this many times for timing')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path)
+    rng = np.random.default_rng(0)
+    cohort = pd.concat([df] * args.scale, ignore_index=True)
+    # Jitter the copies so the rounding paths see realistic, non-repeating values
+    cohort['Weight_kg'] = _round(cohort['Weight_kg'] + rng.uniform(-5, 5, len(cohort)), 1)
+    cohort['Height_cm'] = cohort['Height_cm'] + rng.integers(-5, 6, len(cohort))
+    cohort['Waist_cm'] = _round(rng.uniform(60, 130, len(cohort)), 1)
+    cohort['Hip_cm'] = _round(rng.uniform(80, 140, len(cohort)), 1)
+    cohort['Weeks'] = rng.integers(1, 105, len(cohort))
+    activity = cohort['Physical_Activity_Level'].str.lower()
+    rows = list(zip(cohort['Weight_kg'].tolist(), cohort['Height_cm'].tolist(), cohort['Age'].tolist(),
+                    cohort['Gender'].tolist(), activity.tolist(), cohort['Waist_cm'].tolist(),
+                    cohort['Hip_cm'].tolist(), cohort['Weeks'].tolist()))
+
+    def timed(func):
+        started = time.perf_counter()
+        result = func()
+        return result, (time.perf_counter() - started) * 1000
+
+    def scalar():
+        out = {'bmi': [], 'category': [], 'tdee': [], 'bmr': [], 'whr': [], 'body_fat': [], 'deficit': []}
+        for weight, height, age, gender, level, waist, hip, weeks in rows:
+            bmi = calculate_bmi(weight, height / 100)
+            tdee, bmr = calculate_tdee(weight, height, age, gender, level)
+            out['bmi'].append(bmi)
+            out['category'].append(get_bmi_category(bmi)[0])
+            out['tdee'].append(tdee)
+            out['bmr'].append(bmr)
+            out['whr'].append(calculate_whr(waist, hip))
+            out['body_fat'].append(calculate_body_fat_estimate(bmi, age, gender))
+            out['deficit'].append(get_calorie_deficit(tdee, weeks))
+        return out
+
+    def batch():
+        bmi = calculate_bmi_batch(cohort['Weight_kg'], cohort['Height_cm'] / 100)
+        tdee, bmr = calculate_tdee_batch(cohort['Weight_kg'], cohort['Height_cm'], cohort['Age'],
+                                         cohort['Gender'], activity)
+        return {
+            'bmi': bmi,
+            'category': get_bmi_category_batch(bmi)[0],
+            'tdee': tdee,
+            'bmr': bmr,
+            'whr': calculate_whr_batch(cohort['Waist_cm'], cohort['Hip_cm']),
+            'body_fat': calculate_body_fat_estimate_batch(bmi, cohort['Age'], cohort['Gender']),
+            'deficit': get_calorie_deficit_batch(tdee, cohort['Weeks'])
+        }
+
+    expected, scalar_ms = timed(scalar)
+    actual, batch_ms = timed(batch)
+    for name, values in expected.items():
+        mismatches = int((np.asarray(values) != actual[name]).sum())
+        print(f"{name:<10} {'identical' if not mismatches else f'{mismatches} MISMATCHES'}")
+    print(f"{len(cohort):,} rows: scalar {scalar_ms:.0f} ms, batch {batch_ms:.1f} ms "
+          f"({scalar_ms / batch_ms:.0f}x faster)")
+    if any((np.asarray(values) != actual[name]).any() for name, values in expected.items()):
+        raise SystemExit(1)
@@ -0,0 +1,94 @@
+import os
+import time
+from datetime import datetime
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+IMAGE_MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', '1024'))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '85'))
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG').upper()
+# Photos whose perceptual hashes differ in at most this many of 64 bits count as the same dish
+DUPLICATE_DISTANCE = int(os.getenv('IMAGE_DUPLICATE_DISTANCE', '6'))
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'PNG': 'image/png'}
+
+
+def perceptual_hash(img):
+    """64-bit difference hash (dHash) as a 16-character hex string"""
+    small = img.convert('L').resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def hash_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def is_duplicate(hash_a, hash_b, max_distance=DUPLICATE_DISTANCE):
+    return hash_distance(hash_a, hash_b) <= max_distance
+
+
+def photo_taken_date(data):
+    """Capture date from the photo's EXIF as 'YYYY-MM-DD', or None"""
+    try:
+        exif = Image.open(BytesIO(data)).getexif()
+        # DateTimeOriginal lives in the Exif IFD; DateTime (0x0132) is the fallback
+        taken = exif.get_ifd(0x8769).get(0x9003) or exif.get(0x0132)
+        return datetime.strptime(taken[:10], '%Y:%m:%d').strftime('%Y-%m-%d') if taken else None
+    except Exception:
+        return None
+
+
+def preprocess_image(data, max_edge=IMAGE_MAX_EDGE, quality=IMAGE_QUALITY, fmt=IMAGE_FORMAT):
+    """Orient, downscale and re-encode an uploaded photo before it is sent to Gemini
+
+    Applies the EXIF orientation, shrinks the longest edge to max_edge,
+    re-encodes as fmt at the given quality and drops all metadata. Returns a
+    dict with the new payload ('data', 'mime_type'), its size, the bytes
+    saved, the time taken and a perceptual hash for duplicate detection.
+    """
+    started = time.perf_counter()
+    img = Image.open(BytesIO(data))
+    has_metadata = bool(img.info.get('exif')) or bool(img.getexif())
+    img = ImageOps.exif_transpose(img)
+    phash = perceptual_hash(img)
+
+    resized = max(img.size) > max_edge
+    if resized:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    if fmt == 'JPEG' and img.mode != 'RGB':
+        # JPEG has no alpha channel; flatten transparency onto white
+        rgba = img.convert('RGBA')
+        img = Image.new('RGB', rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.split()[-1])
+
+    out = BytesIO()
+    save_args = {'quality': quality, 'optimize': True} if fmt in ('JPEG', 'WEBP') else {'optimize': True}
+    img.save(out, format=fmt, **save_args)
+    encoded = out.getvalue()
+    mime_type = MIME_TYPES.get(fmt, f"image/{fmt.lower()}")
+
+    if len(encoded) >= len(data) and not resized and not has_metadata:
+        # Already small and clean; re-encoding would only cost quality
+        encoded = data
+        mime_type = Image.MIME.get(Image.open(BytesIO(data)).format, mime_type)
+
+    return {
+        'data': encoded,
+        'mime_type': mime_type,
+        'width': img.width,
+        'height': img.height,
+        'original_bytes': len(data),
+        'bytes': len(encoded),
+        'bytes_saved': len(data) - len(encoded),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'phash': phash
+    }
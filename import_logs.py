@@ -0,0 +1,81 @@
+"""Stream historical logs from CSV or JSONL files into nutrition_app.db
+
+Usage:
+    python import_logs.py --user alice --table meal_logs meals_history.csv
+    python import_logs.py --user alice --table water_logs water.jsonl --rejects bad_rows.jsonl
+
+Column names must match the table columns (see database.BULK_TABLES).
+"""
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+
+from database import BULK_TABLES, BULK_CHUNK_SIZE, init_database, get_user_id, bulk_save
+
+
+def read_rows(path, fmt):
+    """Yield one dict per record without loading the file into memory"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {'_parse_error': f"line {line_no}: {e}", '_raw': line}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import meal, water, workout or progress history')
+    parser.add_argument('path', help='CSV or JSONL file to import')
+    parser.add_argument('--user', required=True, help='username that owns the imported rows')
+    parser.add_argument('--table', required=True, choices=sorted(BULK_TABLES))
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE)
+    parser.add_argument('--rejects', help='file for rejected rows (default: <path>.rejects.jsonl)')
+    parser.add_argument('--commit-per-chunk', action='store_true',
+                        help='commit after every chunk instead of one transaction for the whole file')
+    args = parser.parse_args()
+
+    fmt = args.format or ('jsonl' if args.path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+    init_database()
+    user_id = get_user_id(args.user)
+    if user_id is None:
+        sys.exit(f"❌ Unknown user: {args.user}")
+
+    rejects_path = args.rejects or f"{args.path}.rejects.jsonl"
+    rejects_file = None
+
+    def on_reject(row, reason):
+        nonlocal rejects_file
+        if rejects_file is None:
+            rejects_file = open(rejects_path, 'w', encoding='utf-8')
+        if isinstance(row, dict):
+            reason = row.get('_parse_error', reason)
+        rejects_file.write(json.dumps({'reason': reason, 'row': row}, default=str) + '\n')
+
+    started = time.perf_counter()
+    try:
+        stats = bulk_save(user_id, args.table, read_rows(args.path, fmt), chunk_size=args.chunk_size,
+                          on_reject=on_reject, atomic=not args.commit_per_chunk)
+    finally:
+        if rejects_file is not None:
+            rejects_file.close()
+    elapsed = time.perf_counter() - started
+
+    total = stats['inserted'] + stats['rejected']
+    print(f"✅ Imported {stats['inserted']} {args.table} rows for {args.user} in {elapsed:.2f}s "
+          f"({total / elapsed if elapsed else 0:,.0f} rows/s)")
+    if stats['rejected']:
+        print(f"⚠️ Rejected {stats['rejected']} rows; see {os.path.abspath(rejects_path)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+import os
+import math
+import re
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+
+# Opt-in: with NUTRITION_PERF unset nothing is wrapped and span() is a no-op
+PERF_ENABLED = os.getenv('NUTRITION_PERF', '0') == '1'
+PERF_LOG_PATH = os.getenv('NUTRITION_PERF_LOG', '')
+PERF_WINDOW = int(os.getenv('NUTRITION_PERF_WINDOW', '5000'))
+PERF_SESSIONS = int(os.getenv('NUTRITION_PERF_SESSIONS', '500'))
+RUN_HISTORY = 20
+MAX_RUN_EVENTS = 1000
+
+_current_run = contextvars.ContextVar('perf_run', default=None)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples):
+    """count/total/p50/p95/p99 (ms) per (kind, name) from {(kind, name): [ms, ...]}"""
+    rows = []
+    for (kind, name), values in samples.items():
+        ordered = sorted(values)
+        rows.append({
+            'kind': kind,
+            'name': name,
+            'count': len(ordered),
+            'total_ms': round(sum(ordered), 2),
+            'p50_ms': round(percentile(ordered, 50), 3),
+            'p95_ms': round(percentile(ordered, 95), 3),
+            'p99_ms': round(percentile(ordered, 99), 3),
+        })
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+
+# Recorder
+class PerfRecorder:
+    """Process-wide collector of timed events grouped into per-session runs
+
+    Every event (SQL statement, Gemini call, CSV load, chart build) is kept
+    in a bounded window per (kind, name) for cross-session percentiles,
+    attached to the current run, and optionally appended to a JSON lines
+    log together with one summary line per finished run.
+    """
+
+    def __init__(self, log_path=PERF_LOG_PATH, window=PERF_WINDOW, max_sessions=PERF_SESSIONS):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._samples = {}
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._log = open(log_path, 'a', buffering=1) if log_path else None
+
+    def _emit(self, line):
+        if self._log is not None:
+            with self._lock:
+                self._log.write(json.dumps(line) + '\n')
+
+    def record(self, kind, name, ms, **fields):
+        event = {'ts': time.time(), 'kind': kind, 'name': name, 'ms': round(ms, 3), **fields}
+        run = _current_run.get()
+        if run is not None:
+            event['session'] = run['session']
+            event['run'] = run['run']
+            if len(run['events']) < MAX_RUN_EVENTS:
+                run['events'].append(event)
+        with self._lock:
+            window = self._samples.get((kind, name))
+            if window is None:
+                window = self._samples[(kind, name)] = deque(maxlen=self.window)
+            window.append(ms)
+        self._emit(event)
+        return event
+
+    @contextmanager
+    def span(self, kind, name, **fields):
+        """Time the block; the yielded dict can be filled with rows/bytes before it closes"""
+        started = time.perf_counter()
+        extra = dict(fields)
+        try:
+            yield extra
+        finally:
+            self.record(kind, name, (time.perf_counter() - started) * 1000, **extra)
+
+    @contextmanager
+    def run(self, session, label):
+        """Group the events of one rerun (or fragment rerun); nested runs join the outer one"""
+        if _current_run.get() is not None:
+            yield _current_run.get()
+            return
+        with self._lock:
+            history = self._sessions.get(session)
+            if history is None:
+                history = self._sessions[session] = {'runs': deque(maxlen=RUN_HISTORY), 'count': 0}
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session)
+            history['count'] += 1
+            run = {'session': session, 'run': history['count'], 'label': label, 'events': []}
+        token = _current_run.set(run)
+        started = time.perf_counter()
+        try:
+            yield run
+        finally:
+            _current_run.reset(token)
+            run['ms'] = round((time.perf_counter() - started) * 1000, 3)
+            totals = {}
+            for event in run['events']:
+                kind_total = totals.setdefault(event['kind'], {'count': 0, 'ms': 0.0})
+                kind_total['count'] += 1
+                kind_total['ms'] = round(kind_total['ms'] + event['ms'], 3)
+            run['totals'] = totals
+            with self._lock:
+                history['runs'].append(run)
+                window = self._samples.get(('run', label))
+                if window is None:
+                    window = self._samples[('run', label)] = deque(maxlen=self.window)
+                window.append(run['ms'])
+            self._emit({'ts': time.time(), 'kind': 'run', 'name': label, 'session': session,
+                        'run': run['run'], 'ms': run['ms'], 'totals': totals})
+
+    def session_runs(self, session):
+        """The session's most recent runs, newest first"""
+        with self._lock:
+            history = self._sessions.get(session)
+            return list(reversed(history['runs'])) if history else []
+
+    def summary(self):
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+        return summarize(samples)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._sessions.clear()
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder():
+    """Return the process-wide recorder, creating it on first use"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = PerfRecorder()
+    return _recorder
+
+
+def span(kind, name, **fields):
+    """get_recorder().span(...) when instrumentation is on, otherwise a no-op context yielding a dict"""
+    if not PERF_ENABLED:
+        return nullcontext({})
+    return get_recorder().span(kind, name, **fields)
+
+
+def run(session, label):
+    if not PERF_ENABLED:
+        return nullcontext(None)
+    return get_recorder().run(session, label)
+
+
+# SQLite
+def statement_name(sql):
+    """Whitespace-collapsed statement text used to group timings"""
+    return re.sub(r'\s+', ' ', sql).strip()[:200]
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records each statement's execute plus fetch time and row count
+
+    SQLite produces rows lazily, so a statement is recorded once its rows
+    have been read: on exhaustion, on the next execute, on close, or when
+    the cursor is released.
+    """
+
+    _pending = None
+
+    def _start(self, sql):
+        self._flush()
+        self._pending = [statement_name(sql), 0.0, 0]
+
+    def _time(self, started, rows=0):
+        if self._pending is not None:
+            self._pending[1] += (time.perf_counter() - started) * 1000
+            self._pending[2] += rows
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            name, ms, rows = pending
+            get_recorder().record('sql', name, ms, rows=rows if rows else max(self.rowcount, 0))
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._time(started)
+            if self.description is None:
+                self._flush()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._time(started)
+            self._flush()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._time(started, row is not None)
+        if row is None:
+            self._flush()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._time(started, len(rows))
+        if not rows:
+            self._flush()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._time(started, len(rows))
+        self._flush()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._flush()
+            raise
+        self._time(started, 1)
+        return row
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        self._flush()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3.connect factory whose execute() calls go through InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    """Connection class for sqlite3.connect(factory=...)"""
+    return InstrumentedConnection if PERF_ENABLED else sqlite3.Connection
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Aggregate perf JSON lines into p50/p95/p99 per operation')
+    parser.add_argument('logs', nargs='+', help='JSON lines written with NUTRITION_PERF_LOG')
+    parser.add_argument('--kind', help='only this kind (sql, gemini, csv_load, chart, run)')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+
+    samples = {}
+    for path in args.logs:
+        with open(path) as f:
+            for line in f:
+                event = json.loads(line)
+                if args.kind and event['kind'] != args.kind:
+                    continue
+                samples.setdefault((event['kind'], event['name']), []).append(event['ms'])
+    print(f"{'kind':<9} {'count':>7} {'total ms':>10} {'p50':>8} {'p95':>8} {'p99':>8}  name")
+    for row in summarize(samples)[:args.top]:
+        print(f"{row['kind']:<9} {row['count']:>7} {row['total_ms']:>10.1f} {row['p50_ms']:>8.2f} "
+              f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}  {row['name'][:80]}")
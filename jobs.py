@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import cached_query, get_connection, query_cache, transaction
+from gemini_client import generate_response
+from image_pipeline import DUPLICATE_DISTANCE, hash_distance
+
+JOB_WORKERS = int(os.getenv('NUTRITION_JOB_WORKERS', '4'))
+# A running job whose owner stops renewing its lease for this long is requeued by another process
+JOB_LEASE_SECONDS = float(os.getenv('NUTRITION_JOB_LEASE_SECONDS', '60'))
+
+JOB_COLUMNS = ['id', 'user_id', 'kind', 'title', 'status', 'result', 'error',
+               'created_at', 'started_at', 'finished_at']
+
+
+# Job Handlers
+def _run_prompt(payload, input_blob):
+    image_data = None
+    if input_blob is not None:
+        image_data = [{"mime_type": payload['mime_type'], "data": input_blob}]
+    return generate_response(payload['prompt'], image_data)
+
+JOB_HANDLERS = {
+    'meal_plan': _run_prompt,
+    'image_analysis': _run_prompt,
+}
+
+
+# Job Queue
+class JobQueue:
+    """Runs long AI generations on a bounded worker pool, tracked in the jobs table
+
+    Jobs outlive the Streamlit rerun that submitted them; results are stored
+    per user so they can be collected or downloaded again later. Several
+    processes may share the database: a running job is leased to the process
+    that claimed it, which renews the lease while it works, and only jobs
+    whose lease has expired (their process died) are requeued elsewhere.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, lease_seconds=JOB_LEASE_SECONDS):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nutrition-job')
+        self._stop = threading.Event()
+        self._resume()
+        self._heartbeat = threading.Thread(target=self._renew_leases, name='nutrition-job-lease', daemon=True)
+        self._heartbeat.start()
+
+    def _resume(self):
+        # Jobs left queued, or running under an expired lease, are picked up again;
+        # claiming in _run is atomic, so a job submitted by two processes runs once
+        self._reclaim_expired()
+        with get_connection() as conn:
+            job_ids = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status='queued' ORDER BY id")]
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+
+    def _reclaim_expired(self):
+        """Requeue running jobs whose owner stopped renewing their lease; returns their ids"""
+        with transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, user_id FROM jobs WHERE status='running' AND (lease_until IS NULL OR lease_until < ?)",
+                (time.time(),)).fetchall()
+            for job_id, _ in rows:
+                conn.execute("""UPDATE jobs SET status='queued', started_at=NULL, owner=NULL, lease_until=NULL
+                                WHERE id=?""", (job_id,))
+        for _, user_id in rows:
+            _jobs_changed(user_id)
+        return [job_id for job_id, _ in rows]
+
+    def _renew_leases(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                with transaction() as conn:
+                    conn.execute("UPDATE jobs SET lease_until=? WHERE owner=? AND status='running'",
+                                 (time.time() + self.lease_seconds, self.owner))
+                for job_id in self._reclaim_expired():
+                    self._executor.submit(self._run, job_id)
+            except Exception as e:
+                print(f"⚠️ Job lease renewal failed: {e}")
+
+    def submit(self, user_id, kind, title, payload, input_blob=None):
+        """Queue a job and return its id"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with transaction() as conn:
+            cur = conn.execute('''INSERT INTO jobs (user_id, kind, title, payload, input_blob, status, created_at)
+                                  VALUES (?, ?, ?, ?, ?, 'queued', ?)''',
+                               (user_id, kind, title, json.dumps(payload), input_blob, datetime.now().isoformat()))
+            job_id = cur.lastrowid
+        _jobs_changed(user_id)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def _run(self, job_id):
+        with transaction() as conn:
+            claimed = conn.execute("""UPDATE jobs SET status='running', started_at=?, owner=?, lease_until=?
+                                      WHERE id=? AND status='queued'""",
+                                   (datetime.now().isoformat(), self.owner, time.time() + self.lease_seconds,
+                                    job_id)).rowcount
+            row = conn.execute('SELECT user_id, kind, payload, input_blob FROM jobs WHERE id=?', (job_id,)).fetchone()
+        if not claimed or row is None:
+            return
+        user_id, kind, payload, input_blob = row
+        _jobs_changed(user_id)
+        try:
+            result = JOB_HANDLERS[kind](json.loads(payload), input_blob)
+        except Exception as e:
+            status, result, error = 'failed', None, str(e)
+        else:
+            status, error = 'done', None
+        with transaction() as conn:
+            # The input image is no longer needed once the job has finished
+            conn.execute('''UPDATE jobs SET status=?, result=?, error=?, finished_at=?, input_blob=NULL,
+                            lease_until=NULL WHERE id=? AND owner=?''',
+                         (status, result, error, datetime.now().isoformat(), job_id, self.owner))
+        _jobs_changed(user_id)
+
+    def pending_count(self):
+        with get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def shutdown(self, wait=True):
+        self._stop.set()
+        self._executor.shutdown(wait=wait)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Return the process-wide job queue, starting its workers on first use"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+def _jobs_changed(user_id):
+    query_cache.invalidate(user_id, None, 'jobs')
+
+
+def _jobs_scope(limit=20):
+    # Jobs aren't tied to a log date; every state change invalidates the user's whole list
+    return '0000-01-01', '9999-12-31', limit
+
+
+@cached_query(('jobs',), _jobs_scope)
+def list_jobs(user_id, limit=20):
+    with get_connection() as conn:
+        rows = conn.execute(f'''SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE user_id=?
+                                ORDER BY created_at DESC LIMIT ?''', (user_id, limit)).fetchall()
+    return [dict(zip(JOB_COLUMNS, row)) for row in rows]
+
+
+def get_job(user_id, job_id):
+    with get_connection() as conn:
+        row = conn.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM jobs WHERE id=? AND user_id=?',
+                           (job_id, user_id)).fetchone()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def find_image_analysis(user_id, phash, max_distance=DUPLICATE_DISTANCE):
+    """Return the user's latest queued, running or finished analysis of a perceptually matching photo, if any"""
+    with get_connection() as conn:
+        rows = conn.execute(f'''SELECT {', '.join(JOB_COLUMNS)}, payload FROM jobs
+                                WHERE user_id=? AND kind='image_analysis' AND status IN ('queued', 'running', 'done')
+                                ORDER BY created_at DESC''', (user_id,)).fetchall()
+    for row in rows:
+        known = json.loads(row[-1]).get('phash')
+        if known and hash_distance(known, phash) <= max_distance:
+            return dict(zip(JOB_COLUMNS, row))
+    return None
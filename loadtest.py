@@ -0,0 +1,360 @@
+"""Multi-session load test for SQLite write contention
+
+Usage:
+    python loadtest.py --processes 4 --threads 8 --duration 20
+    python loadtest.py --journal-mode DELETE --busy-timeout 0 -o rollback.json
+
+Every worker process runs --threads simulated browser sessions that loop
+over a weighted mix of the app's reads and writes (and stub Gemini calls)
+through the real data-access functions. Storage settings are passed to the
+workers as NUTRITION_DB_* environment variables, so the same run can be
+repeated against a candidate configuration and the reports compared.
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+from database import (init_database, create_user, get_user_id, save_meal_log, save_water_log, save_workout,
+                      save_progress, get_daily_totals, get_water_intake, get_meal_logs, get_range_totals,
+                      water_buffer, WATER_FLUSH_SECONDS)
+from gemini_client import generate_response
+from instrumentation import percentile
+
+LOADTEST_DIR = os.getenv('NUTRITION_BENCH_DIR', '.bench')
+LOADTEST_PASSWORD = 'loadtest-password'
+STARTUP_DELAY = 3.0
+
+FOODS = [('Oatmeal with Berries', 320, 10, 55, 7), ('Grilled Chicken Salad', 380, 42, 12, 18),
+         ('Salmon with Rice', 620, 40, 60, 22), ('Chickpea Curry', 480, 17, 62, 17),
+         ('Protein Shake', 200, 30, 10, 4)]
+WORKOUTS = [('Running', 45, 450, 'moderate'), ('Yoga', 60, 200, 'low'), ('HIIT Training', 30, 400, 'high')]
+
+
+def loadtest_username(i):
+    return f"load{i:05d}"
+
+
+# Session Actions
+# Each takes (user_id, rng) and performs what one click or rerun does in the app
+def rerun(user_id, rng):
+    """A main-app rerun: today's totals, water and meal log"""
+    get_daily_totals(user_id)
+    get_water_intake(user_id)
+    get_meal_logs(user_id)
+
+
+def dashboard(user_id, rng):
+    today = datetime.now().date()
+    get_range_totals(user_id, today - timedelta(days=6), today)
+
+
+def add_water(user_id, rng):
+    save_water_log(user_id, 1)
+
+
+def log_meal(user_id, rng):
+    name, calories, protein, carbs, fats = rng.choice(FOODS)
+    save_meal_log(user_id, {'date': datetime.now().strftime('%Y-%m-%d'), 'meal_type': 'Lunch', 'food_name': name,
+                            'calories': calories, 'protein': protein, 'carbs': carbs, 'fats': fats})
+
+
+def log_workout(user_id, rng):
+    exercise, duration, burned, intensity = rng.choice(WORKOUTS)
+    save_workout(user_id, {'date': datetime.now().strftime('%Y-%m-%d'), 'exercise': exercise,
+                           'duration': duration, 'calories_burned': burned, 'intensity': intensity})
+
+
+def log_progress(user_id, rng):
+    save_progress(user_id, {'date': datetime.now().strftime('%Y-%m-%d'), 'weight': round(rng.uniform(55, 95), 1)})
+
+
+def ask_gemini(user_id, rng):
+    # Mostly distinct prompts, so calls go to the stub model and write to the response cache
+    generate_response(f"Nutrition question {rng.randrange(1000)} from user {user_id}")
+
+
+# Name: (relative weight, action)
+ACTIONS = {
+    'rerun': (55, rerun),
+    'dashboard': (8, dashboard),
+    'add_water': (15, add_water),
+    'log_meal': (10, log_meal),
+    'log_workout': (4, log_workout),
+    'log_progress': (2, log_progress),
+    'ask_gemini': (6, ask_gemini),
+}
+WRITE_ACTIONS = {'add_water', 'log_meal', 'log_workout', 'log_progress'}
+
+
+def is_lock_error(error):
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+
+# Worker
+def run_session(user_id, seed, deadline, think_ms, results, lock):
+    """Loop weighted random actions for one session until deadline, recording latencies and errors"""
+    rng = random.Random(seed)
+    names = list(ACTIONS)
+    weights = [ACTIONS[name][0] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: {'lock': 0, 'other': 0} for name in names}
+    samples = []
+    while time.time() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            ACTIONS[name][1](user_id, rng)
+            latencies[name].append((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            kind = 'lock' if is_lock_error(e) else 'other'
+            errors[name][kind] += 1
+            if len(samples) < 5:
+                samples.append(f"{name}: {type(e).__name__}: {e}")
+        if think_ms:
+            time.sleep(rng.expovariate(1000 / think_ms))
+    with lock:
+        for name in names:
+            results['latencies'][name].extend(latencies[name])
+            for kind, count in errors[name].items():
+                results['errors'][name][kind] += count
+        results['error_samples'].extend(samples[:5 - len(results['error_samples'])])
+
+
+def run_worker(index, threads, users, duration, think_ms, start_at, seed):
+    """Run `threads` sessions in this process and return their raw results"""
+    user_ids = [get_user_id(loadtest_username(i)) for i in range(users)]
+    results = {'latencies': {name: [] for name in ACTIONS},
+               'errors': {name: {'lock': 0, 'other': 0} for name in ACTIONS},
+               'error_samples': []}
+    lock = threading.Lock()
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + duration
+    sessions = []
+    for t in range(threads):
+        session = index * threads + t
+        sessions.append(threading.Thread(target=run_session, daemon=True,
+                                         args=(user_ids[session % users], seed * 100003 + session,
+                                               deadline, think_ms, results, lock)))
+    for thread in sessions:
+        thread.start()
+    for thread in sessions:
+        thread.join()
+    results['elapsed'] = time.time() - start_at
+    try:
+        water_buffer.close()
+    except Exception as e:
+        # The final flush failed; its increments are reported as unflushed below
+        results['error_samples'].append(f"water flush: {type(e).__name__}: {e}")
+    results['water_buffer'] = {**water_buffer.stats, 'unflushed_keys': water_buffer.pending_count(),
+                               'unflushed_increments': water_buffer.pending_increments()}
+    return results
+
+
+def setup_database(users):
+    init_database()
+    for i in range(users):
+        create_user(loadtest_username(i), LOADTEST_PASSWORD)
+
+
+# Report
+def summarize_results(workers, duration):
+    """Throughput, latency percentiles and error rates per action and overall
+
+    With the water buffer on, add_water only times the in-memory add, so
+    the buffer's failed flushes and the increments it never managed to
+    write are counted as add_water lock errors as well.
+    """
+    operations = {}
+    total_ok = total_lock = total_other = 0
+    write_ok = write_lock = 0
+    for name in ACTIONS:
+        values = sorted(v for w in workers for v in w['latencies'][name])
+        lock = sum(w['errors'][name]['lock'] for w in workers)
+        other = sum(w['errors'][name]['other'] for w in workers)
+        if name == 'add_water':
+            lock += sum(w['water_buffer']['failed_flushes'] + w['water_buffer']['unflushed_increments']
+                        for w in workers)
+        attempts = len(values) + lock + other
+        operations[name] = {
+            'ok': len(values),
+            'lock_errors': lock,
+            'other_errors': other,
+            'lock_error_rate': round(lock / attempts, 5) if attempts else 0.0,
+            'throughput_per_s': round(len(values) / duration, 2),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+            'max_ms': round(values[-1], 3) if values else 0.0,
+        }
+        total_ok += len(values)
+        total_lock += lock
+        total_other += other
+        if name in WRITE_ACTIONS:
+            write_ok += len(values)
+            write_lock += lock
+    attempts = total_ok + total_lock + total_other
+    return {
+        'throughput_per_s': round(total_ok / duration, 2),
+        'write_throughput_per_s': round(write_ok / duration, 2),
+        'lock_errors': total_lock,
+        'other_errors': total_other,
+        'lock_error_rate': round(total_lock / attempts, 5) if attempts else 0.0,
+        'write_lock_error_rate': round(write_lock / (write_ok + write_lock), 5) if write_ok + write_lock else 0.0,
+        'operations': operations,
+        'error_samples': [s for w in workers for s in w['error_samples']][:10],
+    }
+
+
+def water_write_stats(workers, db_path, flush_seconds):
+    """Clicks, write transactions (one commit, i.e. one WAL sync, each) and rows stored for add_water"""
+    clicks = sum(len(w['latencies']['add_water']) for w in workers)
+    if flush_seconds > 0:
+        transactions = sum(w['water_buffer']['flushes'] for w in workers)
+    else:
+        transactions = clicks
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute('SELECT COUNT(*) FROM water_logs').fetchone()[0]
+    return {
+        'flush_seconds': flush_seconds,
+        'clicks': clicks,
+        'write_transactions': transactions,
+        'rows': rows,
+        'clicks_per_transaction': round(clicks / transactions, 2) if transactions else 0.0,
+        'clicks_per_row': round(clicks / rows, 2) if rows else 0.0,
+        'failed_flushes': sum(w['water_buffer']['failed_flushes'] for w in workers),
+        'unflushed_increments': sum(w['water_buffer']['unflushed_increments'] for w in workers),
+    }
+
+
+def run_load_test(processes, threads, duration, users=None, think_ms=0.0, seed=0, env=None):
+    """Spawn the worker processes against a fresh database and return the summarized report
+
+    env overrides (e.g. NUTRITION_DB_JOURNAL_MODE) are applied to every
+    worker; the database lives in LOADTEST_DIR and is recreated each run.
+    """
+    users = users or processes * threads
+    env = {**os.environ, **(env or {})}
+    env.setdefault('NUTRITION_DB_PATH', os.path.join(LOADTEST_DIR, 'loadtest.db'))
+    env.setdefault('GEMINI_CACHE_PATH', os.path.join(LOADTEST_DIR, 'loadtest_gemini_cache.db'))
+    env['GEMINI_BACKEND'] = 'stub'
+    env.setdefault('GEMINI_STUB_LATENCY', '0.05')
+    # The gateway's rate limits would otherwise throttle the stub like the real API
+    env.setdefault('GEMINI_RPM', '100000')
+    os.makedirs(LOADTEST_DIR, exist_ok=True)
+    for path in (env['NUTRITION_DB_PATH'], env['GEMINI_CACHE_PATH']):
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    script = os.path.abspath(__file__)
+    subprocess.run([sys.executable, script, 'setup', '--users', str(users)], env=env, check=True)
+    start_at = time.time() + STARTUP_DELAY
+    children = [subprocess.Popen([sys.executable, script, 'worker', str(index), '--threads', str(threads),
+                                  '--users', str(users), '--duration', str(duration), '--think-ms', str(think_ms),
+                                  '--start-at', str(start_at), '--seed', str(seed)],
+                                 env=env, stdout=subprocess.PIPE, text=True)
+                for index in range(processes)]
+    workers = []
+    for child in children:
+        out, _ = child.communicate()
+        if child.returncode:
+            raise RuntimeError(f"load test worker exited with {child.returncode}")
+        workers.append(json.loads(out.strip().splitlines()[-1]))
+
+    elapsed = max(w['elapsed'] for w in workers)
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'processes': processes, 'threads': threads, 'sessions': processes * threads, 'users': users,
+            'duration_s': duration, 'think_ms': think_ms, 'seed': seed, 'sqlite': sqlite3.sqlite_version,
+            'journal_mode': env.get('NUTRITION_DB_JOURNAL_MODE', 'WAL'),
+            'synchronous': env.get('NUTRITION_DB_SYNCHRONOUS', 'NORMAL'),
+            'busy_timeout_ms': int(env.get('NUTRITION_DB_BUSY_TIMEOUT_MS', '5000')),
+            'gemini_stub_latency_s': float(env['GEMINI_STUB_LATENCY']),
+        },
+        'elapsed_s': round(elapsed, 2),
+        **summarize_results(workers, elapsed),
+        'water_writes': water_write_stats(workers, env['NUTRITION_DB_PATH'],
+                                          float(env.get('NUTRITION_WATER_FLUSH_SECONDS', WATER_FLUSH_SECONDS))),
+    }
+
+
+def print_report(report):
+    config = report['config']
+    print(f"{config['sessions']} sessions ({config['processes']} processes x {config['threads']} threads), "
+          f"journal_mode={config['journal_mode']} synchronous={config['synchronous']} "
+          f"busy_timeout={config['busy_timeout_ms']}ms, {report['elapsed_s']}s")
+    print(f"{'action':<13} {'ok':>8} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+          f"{'locked':>7} {'lock %':>7}")
+    for name, stats in report['operations'].items():
+        print(f"{name:<13} {stats['ok']:>8} {stats['throughput_per_s']:>9.1f} {stats['p50_ms']:>9.2f} "
+              f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['max_ms']:>9.1f} "
+              f"{stats['lock_errors']:>7} {stats['lock_error_rate']:>7.2%}")
+    print(f"Total {report['throughput_per_s']:.1f} ops/s ({report['write_throughput_per_s']:.1f} writes/s), "
+          f"lock errors {report['lock_errors']} ({report['lock_error_rate']:.2%} of all, "
+          f"{report['write_lock_error_rate']:.2%} of writes), other errors {report['other_errors']}")
+    water = report['water_writes']
+    print(f"Water: {water['clicks']} clicks -> {water['write_transactions']} write transactions, "
+          f"{water['rows']} rows (buffer {water['flush_seconds']}s), "
+          f"{water['failed_flushes']} failed flushes, {water['unflushed_increments']} clicks never written")
+    for sample in report['error_samples']:
+        print(f"    {sample}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate concurrent sessions against the nutrition database')
+    sub = parser.add_subparsers(dest='command')
+    setup_cmd = sub.add_parser('setup', help='create the load test users (used by run)')
+    setup_cmd.add_argument('--users', type=int, required=True)
+    worker_cmd = sub.add_parser('worker', help='run one worker process (used by run)')
+    worker_cmd.add_argument('index', type=int)
+    worker_cmd.add_argument('--threads', type=int, required=True)
+    worker_cmd.add_argument('--users', type=int, required=True)
+    worker_cmd.add_argument('--duration', type=float, required=True)
+    worker_cmd.add_argument('--think-ms', type=float, default=0.0)
+    worker_cmd.add_argument('--start-at', type=float, required=True)
+    worker_cmd.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='sessions per process')
+    parser.add_argument('--users', type=int, default=None, help='distinct users (default: one per session)')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='mean pause between a session\'s actions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--journal-mode', help='e.g. WAL or DELETE (default: NUTRITION_DB_JOURNAL_MODE or WAL)')
+    parser.add_argument('--synchronous', help='e.g. NORMAL or FULL')
+    parser.add_argument('--busy-timeout', type=int, help='busy_timeout in ms')
+    parser.add_argument('--water-flush-seconds', type=float,
+                        help='water write buffer window (0 writes every click immediately)')
+    parser.add_argument('-o', '--output', help='also write the report as JSON')
+    args = parser.parse_args()
+
+    if args.command == 'setup':
+        setup_database(args.users)
+    elif args.command == 'worker':
+        results = run_worker(args.index, args.threads, args.users, args.duration, args.think_ms,
+                             args.start_at, args.seed)
+        print(json.dumps(results))
+    else:
+        overrides = {}
+        if args.journal_mode:
+            overrides['NUTRITION_DB_JOURNAL_MODE'] = args.journal_mode
+        if args.synchronous:
+            overrides['NUTRITION_DB_SYNCHRONOUS'] = args.synchronous
+        if args.busy_timeout is not None:
+            overrides['NUTRITION_DB_BUSY_TIMEOUT_MS'] = str(args.busy_timeout)
+        if args.water_flush_seconds is not None:
+            overrides['NUTRITION_WATER_FLUSH_SECONDS'] = str(args.water_flush_seconds)
+        report = run_load_test(args.processes, args.threads, args.duration, args.users, args.think_ms,
+                               args.seed, overrides)
+        print_report(report)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"✅ Wrote {args.output}")
@@ -0,0 +1,145 @@
+import math
+import time
+import argparse
+
+import numpy as np
+
+from catalog import RANGE_FIELDS, load_recipe_catalog
+from health_metrics import calculate_tdee, get_macro_breakdown
+
+# Relative weight of each RANGE_FIELDS column when scoring a day against its targets
+MACRO_WEIGHTS = np.array([2.0, 1.0, 1.0, 1.0])
+MEAL_SLOTS = {
+    1: ['Meal'],
+    2: ['Lunch', 'Dinner'],
+    3: ['Breakfast', 'Lunch', 'Dinner'],
+    4: ['Breakfast', 'Lunch', 'Snack', 'Dinner'],
+}
+REFINE_PASSES = 4
+
+
+def macro_targets(calories, macros):
+    """Daily target vector in RANGE_FIELDS order from get_macro_breakdown output"""
+    return np.array([calories, macros['protein_g'], macros['carbs_g'], macros['fat_g']], dtype=float)
+
+
+def _deviation(totals, target):
+    # Weighted squared relative error per row of totals
+    return (((totals - target) / np.maximum(target, 1.0)) ** 2) @ MACRO_WEIGHTS
+
+
+def _pick(scores, taken, exhausted):
+    # Best recipe not already in the day; the max_uses cap gives way only if nothing else is left
+    allowed = ~taken & ~exhausted
+    if not allowed.any():
+        allowed = ~taken
+    return int(np.argmin(np.where(allowed, scores, np.inf)))
+
+
+def plan_meals(catalog, calories, macros, days=7, meals_per_day=3, exclude=(), max_uses=None):
+    """Pick a days x meals_per_day schedule from catalog closest to calories and the get_macro_breakdown macros
+
+    Days are seeded greedily and refined by NumPy-scored swaps; no excluded ingredients, no repeats within a day.
+    """
+    started = time.perf_counter()
+    target = macro_targets(calories, macros)
+    # A single recipe above the whole day's calories can never help
+    pool = catalog.select(exclude=exclude, max_calories=calories)
+    if len(pool) < meals_per_day:
+        raise ValueError(f"Only {len(pool)} recipes fit these constraints; need at least {meals_per_day}")
+    values = catalog.macros[pool]
+    if max_uses is None:
+        max_uses = math.ceil(days * meals_per_day / len(pool))
+    uses = np.zeros(len(pool), dtype=int)
+
+    plan_days = []
+    for day in range(days):
+        chosen = []
+        total = np.zeros(len(RANGE_FIELDS))
+        taken = np.zeros(len(pool), dtype=bool)
+        for slot in range(meals_per_day):
+            share = (target - total) / (meals_per_day - slot)
+            best = _pick(_deviation(values, share), taken, uses >= max_uses)
+            taken[best] = True
+            chosen.append(best)
+            uses[best] += 1
+            total += values[best]
+
+        for _ in range(REFINE_PASSES):
+            improved = False
+            for slot in range(meals_per_day):
+                current = chosen[slot]
+                rest = total - values[current]
+                uses[current] -= 1
+                taken[current] = False
+                scores = _deviation(rest + values, target)
+                best = _pick(scores, taken, uses >= max_uses)
+                if scores[best] < scores[current] - 1e-12:
+                    improved = True
+                else:
+                    best = current
+                taken[best] = True
+                chosen[slot] = best
+                uses[best] += 1
+                total = rest + values[best]
+            if not improved:
+                break
+
+        slots = MEAL_SLOTS.get(meals_per_day, [f"Meal {i + 1}" for i in range(meals_per_day)])
+        plan_days.append({
+            'day': day + 1,
+            'meals': [{'slot': slot, **catalog.recipes[pool[i]]} for slot, i in zip(slots, chosen)],
+            'totals': {field: round(float(value), 1) for field, value in zip(RANGE_FIELDS, total)},
+            'deviation': round(float(_deviation(total, target)), 4)
+        })
+
+    return {
+        'targets': {field: round(float(value), 1) for field, value in zip(RANGE_FIELDS, target)},
+        'days': plan_days,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def describe_plan_prompt(plan, goal=''):
+    """Prompt asking Gemini only for the narrative around an already chosen plan"""
+    lines = []
+    for day in plan['days']:
+        meals = '; '.join(f"{meal['slot']}: {meal['name']}" for meal in day['meals'])
+        lines.append(f"Day {day['day']} ({day['totals']['calories']:.0f} kcal): {meals}")
+    targets = plan['targets']
+    return f"""Here is a {len(plan['days'])}-day meal plan that is already fixed. Do not change the meals.
+Daily targets: {targets['calories']:.0f} kcal, {targets['protein']:.0f}g protein, {targets['carbs']:.0f}g carbs, {targets['fats']:.0f}g fats.
+{chr(10).join(lines)}
+{f'Goal: {goal}' if goal else ''}
+Write a short, encouraging overview, prep tips for the week and a consolidated shopping list."""
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a local macro-target meal plan from meals.csv')
+    parser.add_argument('path', nargs='?', default='meals.csv')
+    parser.add_argument('--weight', type=float, default=70.0)
+    parser.add_argument('--height', type=float, default=175.0, help='height in cm')
+    parser.add_argument('--age', type=int, default=30)
+    parser.add_argument('--gender', default='male')
+    parser.add_argument('--activity', default='moderate')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--meals', type=int, default=3)
+    parser.add_argument('--exclude', default='', help='comma separated ingredients to avoid')
+    args = parser.parse_args()
+
+    catalog = load_recipe_catalog(args.path)
+    if catalog is None:
+        raise SystemExit(f"❌ {args.path} not found")
+    tdee, _ = calculate_tdee(args.weight, args.height, args.age, args.gender, args.activity)
+    exclude = [i for i in args.exclude.split(',') if i.strip()]
+    plan = plan_meals(catalog, tdee, get_macro_breakdown(tdee), args.days, args.meals, exclude)
+    targets = plan['targets']
+    print(f"Targets: {targets['calories']:.0f} kcal, P {targets['protein']:.0f}g, "
+          f"C {targets['carbs']:.0f}g, F {targets['fats']:.0f}g")
+    for day in plan['days']:
+        totals = day['totals']
+        print(f"Day {day['day']}: {totals['calories']:.0f} kcal, P {totals['protein']:.0f}g, "
+              f"C {totals['carbs']:.0f}g, F {totals['fats']:.0f}g  (deviation {day['deviation']:.4f})")
+        for meal in day['meals']:
+            print(f"    {meal['slot']:<10} {meal['name']}")
+    print(f"Planned {len(catalog)} recipes in {plan['elapsed_ms']} ms")